@@ -1,6 +1,8 @@
+import argparse
+from collections import namedtuple
+
 import numpy as np
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 
 
 """
@@ -9,14 +11,29 @@ the Doppler effect equation. It shows the frequency signals perceived by a
 receiver from a moving source (aircraft). The varying parameters include 
 velocity, altitude, wave propagation speed, time of closest approach, and 
 emitted frequency. It generates subplots to show the impact of each parameter 
-on the observed frequency over time.
+on the observed frequency over time. Importing it only defines the model,
+the figure is made by plot_sweeps.
 """
 
 
-def get_t(v0, L, c, tprime0, time_receiver):
+def _prepare(out, dtype, *arrays):
+    """Output buffer and inputs cast to its dtype for the in-place kernels."""
+    if out is None:
+        dtype = np.float64 if dtype is None else dtype
+        out = np.empty(np.broadcast_shapes(*(np.shape(a) for a in arrays)),
+                       dtype=dtype)
+    return out, [np.asarray(a, dtype=out.dtype) for a in arrays]
+
+
+def get_t(v0, L, c, tprime0, time_receiver, out=None, dtype=None):
     """Calculate time in aircraft reference frame from 
     spectrogram reference frame.
 
+    t is the root (arg - sqrt(discriminant)) / (1 - beta**2) of the
+    emission time quadratic. Where arg > 0 it is evaluated as
+    (arg**2 - (L/c)**2) / (arg + sqrt(discriminant)), which neither
+    cancels nor divides by 1 - beta**2, so it stays finite as v0 -> c.
+
     :type v0: numpy.int64 float
     :param v0: Velocity of the aircraft
     :type L: numpy.int64 float
@@ -27,16 +44,44 @@ def get_t(v0, L, c, tprime0, time_receiver):
     :param tprime0: Time of closest approach in spectrogram reference frame
     :type time_receiver: np.array float
     :param time_receiver: Time array in spectrogram reference frame
+    :type out: np.array
+    :param out: Preallocated array of the broadcast shape to write into
+    :type dtype: np.dtype
+    :param dtype: Precision when out is not given, e.g. np.float32,
+        defaults to float64
     :rtype: np.array
     :return: Time array in aircraft reference frame
     """
-    beta = v0/c
-    arg = time_receiver - tprime0 + L/c
-    discriminant = arg**2 - (1 - beta**2) * (arg**2 - (L/c)**2)
-    return (arg - np.sqrt(discriminant)) / (1 - beta**2)
+    out, (v0, L, c, tprime0, time_receiver) = _prepare(
+        out, dtype, v0, L, c, tprime0, time_receiver)
+    beta2 = (v0/c)**2
+    Lc2 = (L/c)**2
 
+    arg = out
+    np.subtract(time_receiver, tprime0, out=arg)
+    arg += L/c
+    # temporaries come from empty_like(out) as ufuncs on 0-d arrays would
+    # return scalars, which can not be written to in place
+    num = np.multiply(arg, arg, out=np.empty_like(out))
+    num -= Lc2
+    root = np.multiply(num, beta2, out=np.empty_like(out))
+    root += Lc2
+    np.sqrt(root, out=root)  # sqrt(discriminant)
 
-def get_f(v0, L, c, t_array, f0):
+    # Give root the sign of arg so that arg + root never cancels, then
+    # t = num / (arg + root) where root > 0 and (arg + root) / (1 - beta**2)
+    # elsewhere. At arg = 0 both forms agree unless L = 0, where t = 0.
+    np.copysign(root, arg, out=root)
+    ahead = root > 0
+    root += arg
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(root, 1 - beta2, out=out)
+        num /= root
+    np.copyto(out, num, where=ahead)
+    return out if out.ndim else out[()]
+
+
+def get_f(v0, L, c, t_array, f0, out=None, dtype=None):
     """Calculate observed frequency (Doppler effect).
 
     :type v0: numpy.int64 float
@@ -49,13 +94,29 @@ def get_f(v0, L, c, t_array, f0):
     :param t_array: Time array in aircraft reference frame
     :type f0: numpy.int64 float
     :param f0: Emitted frequency from aircraft
+    :type out: np.array
+    :param out: Preallocated array of the broadcast shape to write into,
+        may be t_array itself
+    :type dtype: np.dtype
+    :param dtype: Precision when out is not given, e.g. np.float32,
+        defaults to float64
     :rtype: np.array
     :return: Frequency array of received frequency at seonsors corresponding 
     to t_array
     """
-    base = np.sqrt(L**2 + (v0 * t_array)**2)
-    base_checked = np.where(base != 0, base, 1e-10)
-    return f0 / (1 + (v0/c) * (v0*t_array) / base_checked)
+    out, (v0, L, c, t_array, f0) = _prepare(out, dtype, v0, L, c, t_array,
+                                            f0)
+    np.multiply(v0, t_array, out=out)
+    base = np.multiply(out, out, out=np.empty_like(out))
+    base += L**2
+    np.sqrt(base, out=base)  # sqrt(L**2 + (v0*t)**2)
+    if not np.all(L):
+        np.copyto(base, 1e-10, where=base == 0)
+    out /= base
+    out *= v0/c
+    out += 1
+    np.divide(f0, out, out=out)
+    return out if out.ndim else out[()]
 
 
 # Default doppler shift parameters
@@ -67,6 +128,54 @@ DEFAULTS = {
     'L': 4000,
 }
 
+# Result of a parameter sweep: t and f have one axis per swept parameter
+# (in the order given, named in dims) followed by a time axis. coords maps
+# each dim to its values.
+Sweep = namedtuple("Sweep", ["t", "f", "dims", "coords"])
+
+
+def sweep(time_receiver, params=None, **ranges):
+    """Evaluate get_t and get_f over a full factorial parameter sweep
+    in one broadcast call instead of a loop over parameter values.
+
+    :type time_receiver: np.array float
+    :param time_receiver: Time array in spectrogram reference frame
+    :type params: dict
+    :param params: Fixed parameter values, defaults to DEFAULTS
+    :param ranges: Arrays of values for any of v0, L, c, tprime0 and f0,
+        e.g. sweep(time_receiver, v0=np.arange(0, 200, 20), L=[3000, 4000])
+    :rtype: Sweep
+    :return: t and f arrays of shape (len(range_1), ..., len(time_receiver)),
+        read only as parameters that do not affect them are broadcast
+    """
+    values = DEFAULTS.copy()
+    if params is not None:
+        values.update(params)
+    unknown = set(ranges) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)}, "
+                         f"expected some of {list(DEFAULTS)}")
+
+    dims = tuple(ranges) + ('time',)
+    coords = {name: np.asarray(val, dtype=float).ravel()
+              for name, val in ranges.items()}
+    coords['time'] = np.asarray(time_receiver, dtype=float)
+
+    # Give each swept parameter its own axis, time is the last axis
+    ndim = len(dims)
+    for axis, name in enumerate(ranges):
+        shape = [1] * ndim
+        shape[axis] = -1
+        values[name] = coords[name].reshape(shape)
+
+    t = get_t(values['v0'], values['L'], values['c'], values['tprime0'],
+              coords['time'])
+    f = get_f(values['v0'], values['L'], values['c'], t, values['f0'])
+    shape = tuple(len(coords[name]) for name in dims)
+    return Sweep(np.broadcast_to(t, shape), np.broadcast_to(f, shape), dims,
+                 coords)
+
+
 # Variables ranges for plotting differing results for changes in each variable
 VAR_RANGES = {
     'base': np.arange(0, 241, 1),
@@ -77,51 +186,94 @@ VAR_RANGES = {
     'f0': np.arange(0, 250, 20),
 }
 
-# Create subplots
-fig, axs = plt.subplots(2, 3, figsize=(11, 7), sharex=True, sharey=True)
-axs = axs.flatten()
-cm = plt.cm.rainbow
-
-# Time array for plotting
-time_receiver = VAR_RANGES['base']
-
-# Plot for each variable
-var_names = list(VAR_RANGES.keys())
-for n, var_name in enumerate(var_names):
-    params = DEFAULTS.copy()
-
-    # Base plot with default parameters
-    tprime = get_t(params['v0'], params['L'], params['c'], 
-                params['tprime0'], time_receiver)
-    ft = get_f(params['v0'], params['L'], params['c'], tprime, params['f0'])
-
-    axs[n].plot(time_receiver, ft, c='k', linewidth=0.5, zorder=10)
-    axs[n].axvline(params['tprime0'], c='k', linewidth=0.5, zorder=10)
-    axs[n].set_title(f'Varying {var_name}')
-    axs[n].set_ylim(100, 225)
-    axs[n].set_xlim(0, 240)
-
-    # Set labels
-    if n in [0, 3]:
-        axs[n].set_ylabel('Frequency (Hz)')
-    if n in [3, 4, 5]:
-        axs[n].set_xlabel('Time (s)')
-
-    # Skip variable plotting for base case
-    if n != 0:
-        # Add colorbar for each subplot except the first
-        var_values = VAR_RANGES[var_name]
-        norm = plt.Normalize(var_values.min(), var_values.max())
-        sm = mpl.cm.ScalarMappable(cmap=cm, norm=norm)
-        plt.colorbar(sm, ax=axs[n], orientation='vertical', pad=0.01, aspect=30)
-
-        # Plot for varying parameters 
-        for val in var_values:
-            params[var_name] = val
-            tprime = get_t(params['v0'], params['L'], params['c'], 
-                        params['tprime0'], time_receiver)
-            ft = get_f(params['v0'], params['L'], params['c'], tprime, 
+
+def plot_sweeps(var_ranges=VAR_RANGES, params=DEFAULTS, fname=None,
+                headless=None, rasterized=True):
+    """Plot the observed frequency while varying each parameter in turn.
+
+    Each subplot draws all curves of its sweep as one LineCollection.
+
+    :type var_ranges: dict
+    :param var_ranges: 'base' time array and values for each parameter
+    :type params: dict
+    :param params: Default parameter values
+    :type fname: str
+    :param fname: Save the figure to this file
+    :type headless: bool
+    :param headless: Use the non-interactive Agg backend and do not show
+        the figure, defaults to True when fname is given
+    :type rasterized: bool
+    :param rasterized: Rasterize the curves in vector outputs (pdf, svg)
+    :rtype: matplotlib.figure.Figure
+    :return: The figure
+    """
+    if headless is None:
+        headless = fname is not None
+    if headless:
+        mpl.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    # Create subplots
+    fig, axs = plt.subplots(2, 3, figsize=(11, 7), sharex=True, sharey=True)
+    axs = axs.flatten()
+    cm = plt.cm.rainbow
+
+    # Time array for plotting
+    time_receiver = var_ranges['base']
+
+    # Base curve with default parameters
+    tprime = get_t(params['v0'], params['L'], params['c'],
+                   params['tprime0'], time_receiver)
+    base_ft = get_f(params['v0'], params['L'], params['c'], tprime,
                     params['f0'])
-            axs[n].plot(time_receiver, ft, color=cm(norm(val)), linewidth=0.5)
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+
+    # Plot for each variable
+    for n, var_name in enumerate(var_ranges):
+        axs[n].plot(time_receiver, base_ft, c='k', linewidth=0.5, zorder=10)
+        axs[n].axvline(params['tprime0'], c='k', linewidth=0.5, zorder=10)
+        axs[n].set_title(f'Varying {var_name}')
+        axs[n].set_ylim(100, 225)
+        axs[n].set_xlim(0, 240)
+
+        # Set labels
+        if n in [0, 3]:
+            axs[n].set_ylabel('Frequency (Hz)')
+        if n in [3, 4, 5]:
+            axs[n].set_xlabel('Time (s)')
+
+        # Skip variable plotting for base case
+        if n != 0:
+            # All curves of the sweep as (n_values, n_times, 2) segments
+            var_values = var_ranges[var_name]
+            result = sweep(time_receiver, params, **{var_name: var_values})
+            segments = np.stack(
+                [np.broadcast_to(time_receiver, result.f.shape), result.f],
+                axis=-1)
+            lines = LineCollection(segments, cmap=cm, linewidths=0.5,
+                                   norm=plt.Normalize(var_values.min(),
+                                                      var_values.max()))
+            lines.set_array(var_values)
+            lines.set_rasterized(rasterized)
+            axs[n].add_collection(lines)
+
+            # Add colorbar for each subplot except the first
+            plt.colorbar(lines, ax=axs[n], orientation='vertical', pad=0.01,
+                         aspect=30)
+    plt.tight_layout()
+    if fname is not None:
+        fig.savefig(fname)
+    if not headless:
+        plt.show()
+    return fig
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Plot Doppler curves while varying each parameter")
+    parser.add_argument('--output', default=None,
+                        help="save the figure here (png, pdf, svg, ...)")
+    parser.add_argument('--headless', action='store_true',
+                        help="do not open a window")
+    args = parser.parse_args()
+    plot_sweeps(fname=args.output, headless=args.headless or None)
@@ -0,0 +1,135 @@
+import ast
+import os
+import time
+
+import numpy as np
+
+from HW2_rewrite import DEFAULTS, get_f, get_t
+
+
+"""
+This script checks and times the in-place get_t/get_f kernels of
+HW2_rewrite.py against the previous vectorized versions and the loop
+versions of HW2_old_code.py, on a single curve and on a parameter sweep,
+in float64 and float32. It also compares their accuracy as v0 -> c.
+"""
+
+
+def get_t_previous(v0, L, c, tprime0, time_receiver):
+    """get_t before the in-place, cancellation free rewrite."""
+    beta = v0/c
+    arg = time_receiver - tprime0 + L/c
+    discriminant = arg**2 - (1 - beta**2) * (arg**2 - (L/c)**2)
+    return (arg - np.sqrt(discriminant)) / (1 - beta**2)
+
+
+def get_f_previous(v0, L, c, t_array, f0):
+    """get_f before the in-place rewrite."""
+    base = np.sqrt(L**2 + (v0 * t_array)**2)
+    base_checked = np.where(base != 0, base, 1e-10)
+    return f0 / (1 + (v0/c) * (v0*t_array) / base_checked)
+
+
+def load_old_code():
+    """get_t and get_f from HW2_old_code.py, without running its figure."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "HW2_old_code.py")
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    tree.body = [node for node in tree.body
+                 if isinstance(node, ast.FunctionDef)]
+    namespace = {"np": np}
+    exec(compile(tree, path, "exec"), namespace)
+    return namespace["get_t"], namespace["get_f"]
+
+
+def timeit(func, repeat=20):
+    """Best time of repeated calls of func."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    get_t_old, get_f_old = load_old_code()
+    v0, L, c, tprime0, f0 = (DEFAULTS[k] for k in ('v0', 'L', 'c', 'tprime0',
+                                                   'f0'))
+
+    # Correctness on the default curve
+    time_receiver = np.arange(0, 241, 1.0)
+    f_new = get_f(v0, L, c, get_t(v0, L, c, tprime0, time_receiver), f0)
+    f_prev = get_f_previous(v0, L, c, get_t_previous(v0, L, c, tprime0,
+                                                     time_receiver), f0)
+    f_old = np.array(get_f_old(v0, L, c, get_t_old(v0, L, c, tprime0,
+                                                   time_receiver), f0))
+    f_32 = get_f(v0, L, c, get_t(v0, L, c, tprime0, time_receiver,
+                                 dtype=np.float32), f0, dtype=np.float32)
+    print("max |f - f_previous|     ", np.abs(f_new - f_prev).max())
+    print("max |f - f_old_code|     ", np.abs(f_new - f_old).max())
+    print("max |f_float32 - f|      ", np.abs(f_32 - f_new).max())
+    # scalar inputs, e.g. one receiver time
+    f_scalar = get_f(v0, L, c, get_t(v0, L, c, tprime0, 100.), f0)
+    print("|f - f_previous| scalar  ", abs(f_scalar - get_f_previous(
+        v0, L, c, get_t_previous(v0, L, c, tprime0, 100.), f0)))
+
+    # Accuracy as v0 -> c against the previous formula in long double
+    ld = np.longdouble
+    for v in [0.9 * c, 0.999 * c, 0.999999 * c]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_ref = get_t_previous(ld(v), ld(L), ld(c), ld(tprime0),
+                                   time_receiver.astype(ld))
+            t_prev = get_t_previous(v, L, c, tprime0, time_receiver)
+        t_new = get_t(v, L, c, tprime0, time_receiver)
+        ahead = time_receiver - tprime0 + L/c > 0
+        keep = ahead & (t_ref != 0)
+        err_prev = np.abs((t_prev[keep] - t_ref[keep]) / t_ref[keep])
+        err_new = np.abs((t_new[keep] - t_ref[keep]) / t_ref[keep])
+        print(f"v0 = {v / c:.6f} c: max relative error of t after arrival, "
+              f"previous {np.nanmax(err_prev):.2e}, "
+              f"new {np.nanmax(err_new):.2e}")
+
+    # Timing on a long curve
+    time_receiver = np.linspace(0, 240, 1_000_000)
+    t_buf = np.empty_like(time_receiver)
+    t_buf32 = np.empty(time_receiver.shape, dtype=np.float32)
+    tr32 = time_receiver.astype(np.float32)
+    old_receiver = time_receiver[:20_000]
+    results = {
+        "loop (HW2_old_code, 2% of points)": timeit(
+            lambda: get_f_old(v0, L, c, get_t_old(v0, L, c, tprime0,
+                                                  old_receiver), f0),
+            repeat=3) * len(time_receiver) / len(old_receiver),
+        "previous": timeit(lambda: get_f_previous(
+            v0, L, c, get_t_previous(v0, L, c, tprime0, time_receiver), f0)),
+        "in-place": timeit(lambda: get_f(
+            v0, L, c, get_t(v0, L, c, tprime0, time_receiver), f0)),
+        "in-place, out=": timeit(lambda: get_f(
+            v0, L, c, get_t(v0, L, c, tprime0, time_receiver, out=t_buf),
+            f0, out=t_buf)),
+        "in-place, float32 out=": timeit(lambda: get_f(
+            v0, L, c, get_t(v0, L, c, tprime0, tr32, out=t_buf32), f0,
+            out=t_buf32)),
+    }
+    print(f"\nget_f(get_t(...)) on {len(time_receiver)} samples:")
+    for name, elapsed in results.items():
+        print(f"  {name:36s} {elapsed * 1e3:9.2f} ms")
+
+    # Timing on a sweep over v0 and L
+    time_receiver = np.arange(0, 241, 0.25)
+    v0s = np.arange(0, 200, 2.0)[:, None, None]
+    Ls = np.arange(100, 5000, 50.0)[None, :, None]
+    buf = np.empty((v0s.size, Ls.size, time_receiver.size))
+    results = {
+        "previous": timeit(lambda: get_f_previous(
+            v0s, Ls, c, get_t_previous(v0s, Ls, c, tprime0, time_receiver),
+            f0), repeat=5),
+        "in-place, out=": timeit(lambda: get_f(
+            v0s, Ls, c, get_t(v0s, Ls, c, tprime0, time_receiver, out=buf),
+            f0, out=buf), repeat=5),
+    }
+    print(f"\nSweep of {buf.shape} points:")
+    for name, elapsed in results.items():
+        print(f"  {name:36s} {elapsed * 1e3:9.2f} ms")
@@ -0,0 +1,288 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from HW2_rewrite import DEFAULTS, get_f, get_t
+
+
+"""
+This script fits the Doppler model of HW2_rewrite.py to observed frequency
+picks of aircraft overflights. For each track the aircraft velocity v0,
+altitude L, time of closest approach tprime0 and emitted frequency f0 are
+found by Levenberg-Marquardt least squares with an analytic Jacobian, with
+the wave propagation speed c held fixed. Many independent tracks are
+fitted concurrently in a process pool.
+"""
+
+
+# Order of the fitted parameters in parameter arrays and Jacobian columns
+PARAMS = ('v0', 'L', 'tprime0', 'f0')
+
+# Result of fitting one track
+Fit = namedtuple("Fit", ["params", "cost", "niter", "converged"])
+
+
+def model(p, time_receiver, c):
+    """Observed frequency for parameters p = (v0, L, tprime0, f0).
+
+    :type p: np.array
+    :param p: v0, L, tprime0 and f0
+    :type time_receiver: np.array float
+    :param time_receiver: Time array in spectrogram reference frame
+    :type c: float
+    :param c: Velocity of the wave propagation
+    :rtype: np.array
+    :return: Frequency array of received frequency at sensors
+    """
+    v0, L, tprime0, f0 = p
+    t_array = get_t(v0, L, c, tprime0, time_receiver)
+    return get_f(v0, L, c, t_array, f0)
+
+
+def jacobian(p, time_receiver, c):
+    """Analytic derivatives of the observed frequency with respect to
+    v0, L, tprime0 and f0.
+
+    t is evaluated as in get_t, but as (arg**2 - (L/c)**2) / (arg + s),
+    s = sqrt(discriminant), where arg > 0 so that arg - s does not cancel.
+
+    :type p: np.array
+    :param p: v0, L, tprime0 and f0
+    :type time_receiver: np.array float
+    :param time_receiver: Time array in spectrogram reference frame
+    :type c: float
+    :param c: Velocity of the wave propagation
+    :rtype: (np.array, np.array)
+    :return: Frequency array and (len(time_receiver), 4) Jacobian
+    """
+    v0, L, tprime0, f0 = p
+    beta = v0/c
+    q = 1 - beta**2
+    arg = time_receiver - tprime0 + L/c
+    num = arg**2 - (L/c)**2
+    s = np.sqrt(beta**2 * num + (L/c)**2)
+    ds_darg = beta**2 * arg / s
+    ds_dbeta = beta * num / s
+    ds_dL = (beta**2 * arg / c + q * L / c**2) / s
+
+    # derivatives of t, from t * (arg + s) = num where arg > 0 and from
+    # t * q = arg - s elsewhere
+    ahead = arg > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        den = np.where(ahead, arg + s, q)
+        t = np.where(ahead, num, arg - s) / den
+        dt_darg = np.where(ahead, 2*arg - t * (1 + ds_darg),
+                           1 - ds_darg) / den
+        dt_dbeta = np.where(ahead, -t * ds_dbeta,
+                            -ds_dbeta + 2 * beta * t) / den
+        dt_dL = np.where(ahead, 2*arg/c - 2*L/c**2 - t * (1/c + ds_dL),
+                         1/c - ds_dL) / den
+
+    # f = f0 / (1 + beta * g), g = u / sqrt(L**2 + u**2), u = v0 * t
+    u = v0 * t
+    r = np.sqrt(L**2 + u**2)
+    g = u / r
+    dg_du = L**2 / r**3
+    dg_dL = -u * L / r**3
+    h = 1 + beta * g
+    f = f0 / h
+    df_dh = -f / h
+
+    dh_dv0 = g / c + beta * dg_du * (t + v0 * dt_dbeta / c)
+    dh_dL = beta * (dg_dL + dg_du * v0 * dt_dL)
+    dh_dtprime0 = -beta * dg_du * v0 * dt_darg
+
+    J = np.empty((len(time_receiver), 4))
+    J[:, 0] = df_dh * dh_dv0
+    J[:, 1] = df_dh * dh_dL
+    J[:, 2] = df_dh * dh_dtprime0
+    J[:, 3] = 1 / h
+    return f, J
+
+
+def initial_guess(time_receiver, f_obs, c):
+    """Starting parameters read off the observed curve.
+
+    Far from closest approach f -> f0 / (1 -/+ beta), at closest approach
+    f = f0 and df/dt' = -f0 * beta * v0 / L.
+
+    :rtype: np.array
+    :return: v0, L, tprime0 and f0
+    """
+    f_max, f_min = f_obs.max(), f_obs.min()
+    f0 = 2 * f_max * f_min / (f_max + f_min)
+    beta = (f_max - f_min) / (f_max + f_min)
+    v0 = max(beta * c, 1.0)
+
+    # first downward crossing of f0
+    above = f_obs >= f0
+    cross = np.flatnonzero(above[:-1] & ~above[1:])
+    if len(cross) == 0:
+        return np.array([v0, DEFAULTS['L'], np.median(time_receiver), f0])
+    i = cross[0]
+    w = (f_obs[i] - f0) / (f_obs[i] - f_obs[i + 1])
+    tprime0 = time_receiver[i] + w * (time_receiver[i + 1] - time_receiver[i])
+
+    slope = (f_obs[i + 1] - f_obs[i]) / (time_receiver[i + 1] - time_receiver[i])
+    L = -f0 * beta * v0 / slope if slope < 0 else DEFAULTS['L']
+    return np.array([v0, L, tprime0, f0])
+
+
+def fit_track(time_receiver, f_obs, c=DEFAULTS['c'], p0=None, max_iter=100,
+              tol=1e-10):
+    """Fit v0, L, tprime0 and f0 to one track of frequency picks.
+
+    :type time_receiver: np.array float
+    :param time_receiver: Pick times in spectrogram reference frame
+    :type f_obs: np.array float
+    :param f_obs: Picked frequencies
+    :type c: float
+    :param c: Velocity of the wave propagation, held fixed
+    :type p0: np.array
+    :param p0: Starting v0, L, tprime0 and f0, estimated if not given
+    :rtype: Fit
+    :return: Fitted parameters, half the sum of squared residuals, number
+        of iterations and whether the relative cost change fell below tol
+    """
+    time_receiver = np.asarray(time_receiver, dtype=float)
+    f_obs = np.asarray(f_obs, dtype=float)
+    p = initial_guess(time_receiver, f_obs, c) if p0 is None else \
+        np.array(p0, dtype=float)
+
+    f, J = jacobian(p, time_receiver, c)
+    res = f_obs - f
+    cost = 0.5 * res @ res
+    lam = 1e-3
+    converged = False
+    for niter in range(1, max_iter + 1):
+        JtJ = J.T @ J
+        g = J.T @ res
+        while True:
+            A = JtJ + lam * np.diag(np.diag(JtJ))
+            try:
+                step = np.linalg.solve(A, g)
+            except np.linalg.LinAlgError:
+                step = np.linalg.lstsq(A, g, rcond=None)[0]
+            p_new = p + step
+            # keep the aircraft subsonic and above the receiver
+            if 0 < p_new[0] < c and p_new[1] > 0:
+                f_new = model(p_new, time_receiver, c)
+                res_new = f_obs - f_new
+                cost_new = 0.5 * res_new @ res_new
+                if cost_new <= cost:
+                    break
+            lam *= 10
+            if lam > 1e16:
+                return Fit(dict(zip(PARAMS, p)), cost, niter, converged)
+
+        converged = cost - cost_new <= tol * max(cost, 1e-300)
+        p, cost = p_new, cost_new
+        lam = max(lam / 10, 1e-12)
+        if converged:
+            break
+        f, J = jacobian(p, time_receiver, c)
+        res = f_obs - f
+    return Fit(dict(zip(PARAMS, p)), cost, niter, converged)
+
+
+def _fit_chunk(args):
+    tracks, c = args
+    return [fit_track(t, f, c) for t, f in tracks]
+
+
+def fit_tracks(tracks, c=DEFAULTS['c'], nproc=None, chunksize=16):
+    """Fit many independent tracks in a process pool.
+
+    :type tracks: list
+    :param tracks: (time_receiver, f_obs) pairs
+    :type c: float
+    :param c: Velocity of the wave propagation
+    :type nproc: int
+    :param nproc: Number of worker processes, defaults to the core count,
+        1 fits in this process
+    :type chunksize: int
+    :param chunksize: Tracks sent to a worker at a time
+    :rtype: list
+    :return: Fit for each track, in order
+    """
+    nproc = nproc or os.cpu_count()
+    if nproc == 1:
+        return _fit_chunk((tracks, c))
+    chunks = [(tracks[i:i + chunksize], c)
+              for i in range(0, len(tracks), chunksize)]
+    with ProcessPoolExecutor(max_workers=nproc) as executor:
+        return [fit for chunk in executor.map(_fit_chunk, chunks)
+                for fit in chunk]
+
+
+def synthetic_tracks(ntracks, npicks=241, noise=0.5, seed=0):
+    """Tracks from DEFAULTS with randomly perturbed parameters plus noise.
+
+    :rtype: (list, np.array)
+    :return: (time_receiver, f_obs) pairs and the true (ntracks, 4)
+        parameters
+    """
+    rng = np.random.default_rng(seed)
+    time_receiver = np.linspace(0, 240, npicks)
+    base = np.array([DEFAULTS[name] for name in PARAMS], dtype=float)
+    scale = np.array([0.3, 0.3, 0.15, 0.2])
+    true = base * (1 + scale * rng.uniform(-1, 1, (ntracks, 4)))
+    tracks = []
+    for p in true:
+        f = model(p, time_receiver, DEFAULTS['c'])
+        tracks.append((time_receiver, f + noise * rng.standard_normal(npicks)))
+    return tracks, true
+
+
+def finite_difference_jacobian(p, time_receiver, c, rel_step=1e-6):
+    """Central difference Jacobian, for checking jacobian."""
+    J = np.empty((len(time_receiver), 4))
+    for k in range(4):
+        dp = np.zeros(4)
+        dp[k] = rel_step * max(abs(p[k]), 1.0)
+        J[:, k] = (model(p + dp, time_receiver, c)
+                   - model(p - dp, time_receiver, c)) / (2 * dp[k])
+    return J
+
+
+if __name__ == "__main__":
+    c = DEFAULTS['c']
+    p = np.array([DEFAULTS[name] for name in PARAMS], dtype=float)
+    time_receiver = np.linspace(0, 240, 241)
+
+    # Analytic against finite difference Jacobian
+    _, J = jacobian(p, time_receiver, c)
+    J_fd = finite_difference_jacobian(p, time_receiver, c)
+    err = np.abs(J - J_fd).max(axis=0) / np.abs(J_fd).max(axis=0)
+    print("Jacobian relative error vs finite differences:",
+          dict(zip(PARAMS, err.round(10))))
+    nrep = 2000
+    start = time.perf_counter()
+    for _ in range(nrep):
+        jacobian(p, time_receiver, c)
+    t_analytic = (time.perf_counter() - start) / nrep
+    start = time.perf_counter()
+    for _ in range(nrep):
+        finite_difference_jacobian(p, time_receiver, c)
+    t_fd = (time.perf_counter() - start) / nrep
+    print(f"Jacobian: analytic {t_analytic * 1e6:.1f} us, "
+          f"finite differences {t_fd * 1e6:.1f} us")
+
+    # Batch fit of synthetic tracks
+    ntracks = 2000
+    tracks, true = synthetic_tracks(ntracks)
+    for nproc in sorted({1, os.cpu_count()}):
+        start = time.perf_counter()
+        fits = fit_tracks(tracks, c, nproc=nproc)
+        elapsed = time.perf_counter() - start
+        print(f"nproc {nproc}: {ntracks} tracks in {elapsed:.2f}s "
+              f"({ntracks / elapsed:.0f} tracks/s)")
+
+    fitted = np.array([[fit.params[name] for name in PARAMS] for fit in fits])
+    rel = np.abs(fitted - true) / np.abs(true)
+    print("converged:", sum(fit.converged for fit in fits), "/", ntracks)
+    print("median relative error:",
+          dict(zip(PARAMS, np.median(rel, axis=0).round(5))))
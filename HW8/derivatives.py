@@ -0,0 +1,287 @@
+import argparse
+import csv
+import math
+import os
+from collections import namedtuple
+
+from mpi4py import MPI
+import numpy as np
+
+"""
+Finite-difference derivatives of gridded fields decomposed over MPI ranks.
+The grid is split into one block per rank of a Cartesian communicator and
+every rank only holds its own block. Derivatives along an axis use central
+stencils of 2nd or 4th order accuracy, which reach accuracy // 2 points
+into the neighbouring blocks. Those ghost points are exchanged with
+Isend/Irecv while the interior of the block, which needs no ghost points,
+is being computed. At the edges of the domain one-sided stencils of the
+same order are used.
+
+The 2D Gaussian of Lab5 on [-2, 2]² is differentiated and checked against
+its analytic derivative, then the same derivative is timed on 1 up to all
+ranks for a strong scaling report.
+
+    mpiexec -n 4 python derivatives.py 1 --accuracy 4 --dims 2
+"""
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+XMIN, XMAX = -2.0, 2.0
+SIGMA = 1.0
+
+# A rank's part of a distributed grid
+Block = namedtuple("Block", ["cart", "slices", "shape"])
+
+
+def stencil_weights(offsets, order):
+    """
+    Weights of the order-th derivative at 0 from samples at the integer
+    offsets, exact for polynomials up to degree len(offsets) - 1. Solves
+    sum_j w_j * offsets_j**k = k! if k == order else 0.
+    """
+    offsets = np.asarray(offsets, dtype=float)
+    k = np.arange(len(offsets))
+    rhs = np.zeros(len(offsets))
+    rhs[order] = math.factorial(order)
+    weights = np.linalg.solve(offsets[None, :] ** k[:, None], rhs)
+    # e.g. the centre weight of a first derivative, zero up to roundoff
+    weights[np.abs(weights) < 1e-12 * np.abs(weights).max()] = 0
+    return weights
+
+
+def decompose(shape, comm=comm):
+    """
+    Split a grid of the given global shape into one block per rank.
+
+    returns
+    block (Block): Cartesian communicator, this rank's slices of the
+        global grid and the global shape
+    """
+    dims = MPI.Compute_dims(comm.Get_size(), len(shape))
+    cart = comm.Create_cart(dims, periods=[False] * len(shape))
+    coords = cart.Get_coords(cart.Get_rank())
+    slices = tuple(slice(n * c // d, n * (c + 1) // d)
+                   for n, d, c in zip(shape, dims, coords))
+    return Block(cart, slices, tuple(shape))
+
+
+def _take(u, axis, start, stop):
+    """u[start:stop] along axis."""
+    index = [slice(None)] * u.ndim
+    index[axis] = slice(start, stop)
+    return u[tuple(index)]
+
+
+def _apply(src, weights, axis, out):
+    """out = sum_k weights[k] * src[k:k + len(out)] along axis."""
+    n = out.shape[axis]
+    np.multiply(_take(src, axis, 0, n), weights[0], out=out)
+    for k, w in enumerate(weights[1:], 1):
+        if w:
+            out += w * _take(src, axis, k, k + n)
+
+
+def _one_sided(u, axis, order, accuracy, step, du, side):
+    """One-sided stencils for the accuracy // 2 points at a domain edge."""
+    n = u.shape[axis]
+    npoints = accuracy + order
+    for i in range(accuracy // 2):
+        if side == "left":
+            point, samples = i, np.arange(npoints)
+        else:
+            point, samples = n - 1 - i, n - 1 - np.arange(npoints)
+        weights = stencil_weights(samples - point, order) / step**order
+        index = [slice(None)] * u.ndim
+        index[axis] = point
+        du[tuple(index)] = np.tensordot(
+            weights, np.moveaxis(np.take(u, samples, axis=axis), axis, 0), 1)
+
+
+def derivative(u, block, axis, step, order=1, accuracy=4):
+    """
+    Derivative of a distributed field along one axis.
+
+    parameters
+    u (np.array): this rank's block of the field
+    block (Block): the decomposition u belongs to, from decompose
+    axis (int): axis to differentiate along
+    step (float): grid spacing along axis
+    order (int): 1 for the first, 2 for the second derivative
+    accuracy (int): 2 or 4, order of accuracy of the stencils
+
+    returns
+    du (np.array): this rank's block of the derivative
+    """
+    h = accuracy // 2
+    n = u.shape[axis]
+    if n < max(2 * h, accuracy + order):
+        raise ValueError(f"blocks need at least {max(2 * h, accuracy + order)}"
+                         f" points along axis {axis}, this one has {n}")
+    u = np.ascontiguousarray(u)
+    cart = block.cart
+    left, right = cart.Shift(axis, 1)
+
+    # post the ghost point exchange, tag 0 travels right and tag 1 left
+    ghost_left = np.empty_like(_take(u, axis, 0, h))
+    ghost_right = np.empty_like(ghost_left)
+    requests = [
+        cart.Irecv(ghost_left, source=left, tag=0),
+        cart.Irecv(ghost_right, source=right, tag=1),
+        cart.Isend(np.ascontiguousarray(_take(u, axis, 0, h)), dest=left,
+                   tag=1),
+        cart.Isend(np.ascontiguousarray(_take(u, axis, n - h, n)),
+                   dest=right, tag=0),
+    ]
+
+    # interior points while the ghost points are in flight
+    weights = stencil_weights(np.arange(-h, h + 1), order) / step**order
+    du = np.empty(u.shape, dtype=np.result_type(u.dtype, np.float64))
+    _apply(u, weights, axis, _take(du, axis, h, n - h))
+    MPI.Request.Waitall(requests)
+
+    if left == MPI.PROC_NULL:
+        _one_sided(u, axis, order, accuracy, step, du, "left")
+    else:
+        edge = np.concatenate([ghost_left, _take(u, axis, 0, 2 * h)], axis)
+        _apply(edge, weights, axis, _take(du, axis, 0, h))
+    if right == MPI.PROC_NULL:
+        _one_sided(u, axis, order, accuracy, step, du, "right")
+    else:
+        edge = np.concatenate([_take(u, axis, n - 2 * h, n), ghost_right],
+                              axis)
+        _apply(edge, weights, axis, _take(du, axis, n - h, n))
+    return du
+
+
+def local_axes(block, step):
+    """Coordinates of this rank's block along every axis."""
+    return [XMIN + step * np.arange(s.start, s.stop) for s in block.slices]
+
+
+def gaussian(axes, sigma=SIGMA):
+    """The normalised Gaussian of Lab5 on the grid spanned by axes."""
+    grids = np.ix_(*axes)
+    r2 = sum(x**2 for x in grids)
+    return (2 * np.pi * sigma**2) ** (-len(axes) / 2) * np.exp(
+        -r2 / (2 * sigma**2))
+
+
+def gaussian_derivative(axes, axis, order, sigma=SIGMA):
+    """Analytic first or second derivative of gaussian along axis."""
+    x = np.ix_(*axes)[axis]
+    g = gaussian(axes, sigma)
+    if order == 1:
+        return -x / sigma**2 * g
+    return (x**2 / sigma**4 - 1 / sigma**2) * g
+
+
+def grid(n, dims, comm=comm):
+    """Decomposition, spacing and local Gaussian of an n**dims grid."""
+    step = (XMAX - XMIN) / (n - 1)
+    block = decompose((n,) * dims, comm)
+    axes = local_axes(block, step)
+    return block, step, axes, gaussian(axes)
+
+
+def check(n, dims, order, accuracy, comm=comm):
+    """Largest error against the analytic derivative, relative to its max."""
+    block, step, axes, u = grid(n, dims, comm)
+    error = scale = 0.0
+    for axis in range(dims):
+        exact = gaussian_derivative(axes, axis, order)
+        du = derivative(u, block, axis, step, order, accuracy)
+        error = max(error, np.abs(du - exact).max())
+        scale = max(scale, np.abs(exact).max())
+    block.cart.Free()
+    error = comm.allreduce(error, op=MPI.MAX)
+    return error / comm.allreduce(scale, op=MPI.MAX)
+
+
+def time_derivatives(n, dims, order, accuracy, comm=comm, repeat=3):
+    """Best of repeat times for the derivative along every axis."""
+    block, step, _, u = grid(n, dims, comm)
+    best = np.inf
+    for _ in range(repeat):
+        comm.Barrier()
+        start = MPI.Wtime()
+        for axis in range(dims):
+            derivative(u, block, axis, step, order, accuracy)
+        best = min(best, comm.allreduce(MPI.Wtime() - start, op=MPI.MAX))
+    block.cart.Free()
+    return best
+
+
+def strong_scaling(n, dims, order, accuracy, nprocs, repeat=3):
+    """
+    Time the same n**dims grid on the first p ranks of COMM_WORLD for
+    every p in nprocs, the other ranks wait. Speedup and efficiency are
+    relative to the smallest p, stored as base_ranks, which is the serial
+    time only when that is 1.
+    """
+    nprocs = sorted(set(nprocs))
+    if nprocs[-1] > size:
+        raise ValueError(f"can not time {nprocs[-1]} ranks, only {size} "
+                         f"were started")
+    records = []
+    for p in nprocs:
+        sub = comm.Split(0 if rank < p else MPI.UNDEFINED, rank)
+        if sub != MPI.COMM_NULL:
+            elapsed = time_derivatives(n, dims, order, accuracy, sub, repeat)
+            sub.Free()
+        comm.Barrier()
+        if rank == 0:
+            base = records[0]["time"] if records else elapsed
+            records.append({"ranks": p, "n": n, "dims": dims,
+                            "time": elapsed, "base_ranks": nprocs[0],
+                            "speedup": base / elapsed,
+                            "efficiency": base * nprocs[0] / elapsed / p})
+            print("ranks {ranks:>3}: {time:.4f}s speedup {speedup:.2f} "
+                  "efficiency {efficiency:.2f} (relative to {base_ranks} "
+                  "ranks)".format(**records[-1]))
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="MPI finite-difference derivatives of the 2D Gaussian")
+    parser.add_argument("order", type=int, nargs="?", default=1,
+                        choices=[1, 2], help="derivative to take")
+    parser.add_argument("--accuracy", type=int, default=4, choices=[2, 4])
+    parser.add_argument("--dims", type=int, default=2, choices=[1, 2])
+    parser.add_argument("--n", type=int, default=513,
+                        help="points per axis of the correctness check")
+    parser.add_argument("--scaling-n", type=int, default=4096,
+                        help="points per axis of the strong scaling grid")
+    parser.add_argument("--nprocs", nargs="+", type=int,
+                        default=sorted({p for p in [1, 2, 4, 8, 12, 16, 24]
+                                        if p <= size} | {size}))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="CSV file")
+    args = parser.parse_args()
+
+    # error at n and at half the spacing gives the observed order, for the
+    # 4th order second derivative the finer grid nears the roundoff floor
+    # ~ eps / step**2 and the observed order drops below 4
+    for accuracy in [2, 4]:
+        coarse = check(args.n, args.dims, args.order, accuracy)
+        fine = check(2 * args.n - 1, args.dims, args.order, accuracy)
+        if rank == 0:
+            print(f"d{args.order}/dx{args.order} accuracy {accuracy}: "
+                  f"relative error {coarse:.2e} (n={args.n}), "
+                  f"{fine:.2e} (n={2 * args.n - 1}), "
+                  f"observed order {np.log2(coarse / fine):.2f}")
+
+    if rank == 0:
+        print(f"Strong scaling, {args.scaling_n}^{args.dims} grid, "
+              f"accuracy {args.accuracy}")
+    records = strong_scaling(args.scaling_n, args.dims, args.order,
+                             args.accuracy, args.nprocs, args.repeat)
+
+    if rank == 0 and args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(records[0]))
+            writer.writeheader()
+            writer.writerows(records)
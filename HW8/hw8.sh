@@ -12,4 +12,4 @@ ulimit -l unlimited
 
 eval "$(conda shell.bash hook)"
 conda activate $GEOS694
-python derivatives.py 1
+srun python derivatives.py 1 --output scaling.csv
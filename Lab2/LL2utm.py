@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+
+from utm2LL import UTMtoLL, UTMtoLL_batch, ellipsoid_constants, k0
+from utm_letter_designator import utm_letter_designator_array
+
+deg2rad = np.pi / 180.0
+
+
+def _zone_numbers(Lat, Long):
+    """UTM zone number, including the Norway and Svalbard exceptions."""
+    ZoneNumber = (np.floor((Long + 180) / 6) + 1).astype(np.int64)
+    ZoneNumber[Long == 180.0] = 60
+
+    norway = (Lat >= 56.0) & (Lat < 64.0) & (Long >= 3.0) & (Long < 12.0)
+    ZoneNumber[norway] = 32
+
+    svalbard = (Lat >= 72.0) & (Lat < 84.0)
+    for lon_min, lon_max, number in [(0.0, 9.0, 31), (9.0, 21.0, 33),
+                                     (21.0, 33.0, 35), (33.0, 42.0, 37)]:
+        ZoneNumber[svalbard & (Long >= lon_min) & (Long < lon_max)] = number
+    return ZoneNumber
+
+
+def _LLtoUTM_block(const, Lat, Long, northing, easting, ZoneNumber,
+                   zone=None):
+    """Project one block of points into preallocated output arrays."""
+    a = const.a
+    eccSquared = const.eccSquared
+    eccPrimeSquared = const.eccPrimeSquared
+
+    ZoneNumber[:] = _zone_numbers(Lat, Long) if zone is None else zone
+
+    # +3 puts origin in middle of zone
+    LongOrigin = (ZoneNumber - 1) * 6 - 180 + 3
+
+    LatRad = Lat * deg2rad
+    sin_lat = np.sin(LatRad)
+    cos_lat = np.cos(LatRad)
+    tan_lat = np.tan(LatRad)
+
+    N = a / np.sqrt(1 - eccSquared * sin_lat * sin_lat)
+    T = tan_lat * tan_lat
+    C = eccPrimeSquared * cos_lat * cos_lat
+    A = cos_lat * (Long - LongOrigin) * deg2rad
+    A2 = A * A
+
+    M = a * (const.M1 * LatRad - const.M2 * np.sin(2 * LatRad) +
+             const.M3 * np.sin(4 * LatRad) - const.M4 * np.sin(6 * LatRad))
+
+    easting[:] = (k0 * N * A * (1 + (1 - T + C) * A2 / 6 +
+                                (5 - 18 * T + T * T + 72 * C -
+                                 58 * eccPrimeSquared) * A2 * A2 / 120) +
+                  500000.0)
+
+    northing[:] = k0 * (M + N * tan_lat * A2 *
+                        (0.5 + (5 - T + 9 * C + 4 * C * C) * A2 / 24 +
+                         (61 - 58 * T + T * T + 600 * C -
+                          330 * eccPrimeSquared) * A2 * A2 / 720))
+    # 10,000,000 meter offset for southern hemisphere
+    northing[Lat < 0] += 10000000.0
+
+
+def LLtoUTM_batch(ReferenceEllipsoid, Lat, Long, chunksize=1_000_000,
+                  zone=None):
+    """
+    Convert arrays of lat/long to UTM coordinates in one vectorized pass.
+    Equations from USGS Bulletin 1532, the inverse of `UTMtoLL_batch`.
+
+    parameters
+    ReferenceEllipsoid (int or str): see `ellipsoid_constants`
+    Lat (np.array): latitudes in decimal degrees
+    Long (np.array): longitudes in decimal degrees, East positive
+    chunksize (int): points projected per block, bounds the size of the
+        temporaries for very large inputs
+    zone (int): project every point into this zone number instead of its
+        own, e.g. to compare points on both sides of a zone boundary
+
+    returns
+    northing (np.array): UTM northings in m
+    easting (np.array): UTM eastings in m
+    ZoneNumber (np.array): UTM zone numbers
+    ZoneLetter (np.array): UTM latitude band letters
+    """
+    const = ellipsoid_constants(ReferenceEllipsoid)
+    Lat, Long = np.broadcast_arrays(np.asarray(Lat, dtype=np.float64),
+                                    np.asarray(Long, dtype=np.float64))
+    shape = Lat.shape
+    Lat = Lat.ravel()
+    # Make sure the longitude is between -180.00 .. 179.9
+    Long = (Long.ravel() + 180) % 360 - 180
+
+    northing = np.empty(Lat.size, dtype=np.float64)
+    easting = np.empty(Lat.size, dtype=np.float64)
+    ZoneNumber = np.empty(Lat.size, dtype=np.int64)
+    for i in range(0, Lat.size, chunksize):
+        block = slice(i, i + chunksize)
+        _LLtoUTM_block(const, Lat[block], Long[block], northing[block],
+                       easting[block], ZoneNumber[block], zone)
+    ZoneLetter = utm_letter_designator_array(Lat)
+
+    return (northing.reshape(shape), easting.reshape(shape),
+            ZoneNumber.reshape(shape), ZoneLetter.reshape(shape))
+
+
+def LLtoUTM(ReferenceEllipsoid, Lat, Long):
+    """
+    Convert a single lat/long to UTM.
+
+    returns
+    northing (float), easting (float), zone (str): e.g. "6W"
+    """
+    northing, easting, ZoneNumber, ZoneLetter = LLtoUTM_batch(
+        ReferenceEllipsoid, Lat, Long)
+    return (float(northing), float(easting),
+            f"{int(ZoneNumber)}{ZoneLetter}")
+
+
+def zone_strings(ZoneNumber, ZoneLetter):
+    """Combine zone numbers and letters into zones accepted by UTMtoLL."""
+    return np.char.add(np.asarray(ZoneNumber).astype(str), ZoneLetter)
+
+
+if __name__ == "__main__":
+    ellips = 23
+
+    # Round trip against the scalar UTMtoLL
+    northing, easting, zone = LLtoUTM(ellips, 64.86, -147.85)
+    print("  LLtoUTM n / e / zone = ", northing, easting, zone)
+    (lat, lon) = UTMtoLL(ellips, northing, easting, zone)
+    print("  UTMtoLL lon / lat = ", lon, lat)
+
+    # Round trip accuracy and throughput on random points inside UTM limits
+    rng = np.random.default_rng(0)
+    npts = 10_000_000
+    Lat = rng.uniform(-80, 84, npts)
+    Long = rng.uniform(-180, 180, npts)
+
+    start = time.time()
+    northing, easting, ZoneNumber, ZoneLetter = LLtoUTM_batch(ellips, Lat,
+                                                              Long)
+    elapsed = time.time() - start
+    print(f"LLtoUTM_batch: {npts} points in {elapsed:.2f}s "
+          f"({npts / elapsed:.3g} points/s)")
+
+    zones = zone_strings(ZoneNumber, ZoneLetter)
+    start = time.time()
+    lat, lon = UTMtoLL_batch(ellips, northing, easting, zones)
+    elapsed = time.time() - start
+    print(f"UTMtoLL_batch: {npts} points in {elapsed:.2f}s "
+          f"({npts / elapsed:.3g} points/s)")
+
+    dlat = np.abs(lat - Lat)
+    dlon = np.abs((lon - Long + 180) % 360 - 180)
+    print(f"max round trip error: lat {dlat.max():.2e} deg, "
+          f"lon {dlon.max():.2e} deg")
+    assert dlat.max() < 1e-5 and dlon.max() < 1e-5
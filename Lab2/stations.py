@@ -0,0 +1,338 @@
+import time
+
+import numpy as np
+
+from LL2utm import LLtoUTM_batch
+
+"""
+Registry of stations, e.g. stream gauges by StreamGuage.station_id, for
+nearest station and within radius queries from many points such as flight
+track positions (convert UTM tracks with UTMtoLL_batch first).
+
+Stations are projected into the UTM zone they lie in and indexed with a
+uniform grid of square cells per zone. UTM coordinates are only planar
+within one zone, so query points are projected into the zone of the
+stations they are compared with, also when that is not their own zone.
+Distances are planar UTM distances in m. Up to a few hundred km outside
+a zone they agree with great circle distances to within about 0.5%.
+"""
+
+# metres per degree of latitude, bounds degrees of longitude per metre
+M_PER_DEG = 111_320.0
+
+# key of grid cell (ix, iy), ordered by ix then iy
+IY_OFFSET = 2**31
+
+
+def cell_keys(ix, iy):
+    """Sortable int64 keys of grid cells, all cells of one ix contiguous."""
+    iy = np.clip(iy, -IY_OFFSET, IY_OFFSET - 1)
+    return ix * 2**32 + (iy + IY_OFFSET)
+
+
+def _expand(starts, stops):
+    """Indices of all ranges [starts, stops) and the range each came from."""
+    counts = stops - starts
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    index = np.arange(counts.sum()) - np.repeat(first - starts, counts)
+    return owner, index
+
+
+class StationRegistry:
+    """
+    Stations in UTM coordinates with a uniform grid index per zone.
+
+    Northings are signed, without the 10,000 km false northing south of
+    the equator, so that every zone is one continuous plane. Stations are
+    stored zone by zone and within a zone sorted by grid cell, so every
+    cell and every column of cells is a contiguous slice of the coordinate
+    arrays.
+    """
+
+    def __init__(self, ids, lat, lon, cell=10_000.0, ReferenceEllipsoid=23):
+        """
+        parameters
+        ids (np.array): station identifiers, e.g. StreamGuage.station_id
+        lat (np.array): station latitudes in decimal degrees
+        lon (np.array): station longitudes in decimal degrees
+        cell (float): grid cell size in m, about the typical query radius
+        ReferenceEllipsoid (int or str): see `ellipsoid_constants`
+        """
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = (np.asarray(lon, dtype=np.float64).ravel() + 180) % 360 - 180
+        northing, easting, zone, _ = LLtoUTM_batch(ReferenceEllipsoid, lat,
+                                                   lon)
+        northing[lat < 0] -= 10_000_000.0
+        self.cell = float(cell)
+        self.ReferenceEllipsoid = ReferenceEllipsoid
+
+        ix = np.floor(easting / self.cell).astype(np.int64)
+        iy = np.floor(northing / self.cell).astype(np.int64)
+        keys = cell_keys(ix, iy)
+        order = np.lexsort((keys, zone))
+
+        self.index = order  # registry position -> input position
+        self.ids = np.asarray(ids)[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.easting = easting[order]
+        self.northing = northing[order]
+        self.zone = zone[order]
+        self.keys = keys[order]
+        self.ix = ix[order]
+
+        # slice, occupied columns of cells and longitude extent of each zone
+        self.zones = {}
+        numbers, starts = np.unique(self.zone, return_index=True)
+        stops = np.append(starts[1:], len(order))
+        for number, start, stop in zip(numbers, starts, stops):
+            meridian = (number - 1) * 6 - 180 + 3
+            dlon = (self.lon[start:stop] - meridian + 180) % 360 - 180
+            self.zones[int(number)] = (
+                slice(start, stop), np.unique(self.ix[start:stop]),
+                meridian, dlon.min(), dlon.max())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _project(self, lat, lon, number):
+        """Queries in the plane of zone number, with signed northings."""
+        northing, easting, _, _ = LLtoUTM_batch(self.ReferenceEllipsoid, lat,
+                                                lon, zone=number)
+        northing[lat < 0] -= 10_000_000.0
+        return easting, northing
+
+    def _pairs_in_zone(self, number, easting, northing, radius):
+        """(query, station, distance) pairs within radius in one zone."""
+        block, columns, _, _, _ = self.zones[number]
+        keys = self.keys[block]
+        qix = np.floor(easting / self.cell).astype(np.int64)
+        qiy = np.floor(northing / self.cell).astype(np.int64)
+        r = int(np.ceil(radius / self.cell))
+
+        # cells within r of the query, one contiguous run per column. Step
+        # over column offsets, or over occupied columns when there are fewer
+        if 2 * r + 1 <= len(columns):
+            runs = ((np.arange(len(qix)), qix + dx) for dx in range(-r, r + 1))
+        else:
+            runs = ((q, np.full(len(q), column)) for column in columns
+                    for q in [np.flatnonzero(np.abs(qix - column) <= r)]
+                    if len(q))
+        queries, stations = [], []
+        for q, column in runs:
+            lo = np.searchsorted(keys, cell_keys(column, qiy[q] - r), "left")
+            hi = np.searchsorted(keys, cell_keys(column, qiy[q] + r), "right")
+            owner, station = _expand(lo, hi)
+            queries.append(q[owner])
+            stations.append(station + block.start)
+        if not queries:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                    np.empty(0))
+        queries = np.concatenate(queries)
+        stations = np.concatenate(stations)
+
+        distance = np.hypot(self.easting[stations] - easting[queries],
+                            self.northing[stations] - northing[queries])
+        keep = distance <= radius
+        return queries[keep], stations[keep], distance[keep]
+
+    def _pairs(self, lat, lon, radius):
+        """(query, station, distance) pairs within radius over all zones."""
+        # degrees of longitude radius spans at each query, UTM scale < 1.001
+        margin = 1.01 * radius / (M_PER_DEG * np.maximum(
+            np.cos(np.radians(lat)), np.cos(np.radians(89.0))))
+        queries, stations, distances = [], [], []
+        for number, (_, _, meridian, dmin, dmax) in self.zones.items():
+            dlon = (lon - meridian + 180) % 360 - 180
+            q = np.flatnonzero((dlon >= dmin - margin) &
+                               (dlon <= dmax + margin))
+            if len(q) == 0:
+                continue
+            easting, northing = self._project(lat[q], lon[q], number)
+            qi, si, d = self._pairs_in_zone(number, easting, northing, radius)
+            queries.append(q[qi])
+            stations.append(si)
+            distances.append(d)
+        if not queries:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                    np.empty(0))
+        return (np.concatenate(queries), np.concatenate(stations),
+                np.concatenate(distances))
+
+    def within(self, lat, lon, radius, chunksize=2**18):
+        """
+        Stations within radius of every query point.
+
+        parameters
+        lat (np.array): query latitudes in decimal degrees
+        lon (np.array): query longitudes in decimal degrees
+        radius (float): search radius in m
+        chunksize (int): queries per block, bounds temporary memory
+
+        returns
+        query (np.array): index of the query point of each match
+        station (np.array): registry position of the matched station, its
+            id is self.ids[station]
+        distance (np.array): distance in m, sorted by query then distance
+        """
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = (np.asarray(lon, dtype=np.float64).ravel() + 180) % 360 - 180
+        queries, stations, distances = [], [], []
+        for i in range(0, len(lat), chunksize):
+            qi, si, d = self._pairs(lat[i:i + chunksize],
+                                    lon[i:i + chunksize], radius)
+            order = np.lexsort((d, qi))
+            queries.append(qi[order] + i)
+            stations.append(si[order])
+            distances.append(d[order])
+        if not queries:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                    np.empty(0))
+        return (np.concatenate(queries), np.concatenate(stations),
+                np.concatenate(distances))
+
+    def nearest(self, lat, lon, k=1, max_distance=500e3, chunksize=2**18):
+        """
+        The k nearest stations to every query point. The search radius
+        starts at one grid cell and grows by sqrt(2) for queries with fewer
+        than k stations inside it, up to max_distance.
+
+        parameters
+        lat (np.array): query latitudes in decimal degrees
+        lon (np.array): query longitudes in decimal degrees
+        k (int): number of stations per query
+        max_distance (float): stations farther than this in m are not
+            searched, UTM planar distances lose accuracy far from a zone
+        chunksize (int): queries per block, bounds temporary memory
+
+        returns
+        station (np.array): (n, k) registry positions, nearest first, -1
+            where fewer than k stations are within max_distance
+        distance (np.array): (n, k) distances in m, inf where missing
+        """
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = (np.asarray(lon, dtype=np.float64).ravel() + 180) % 360 - 180
+        station = np.full((len(lat), k), -1, dtype=np.int64)
+        distance = np.full((len(lat), k), np.inf)
+
+        pending = np.arange(len(lat))
+        radius = min(self.cell, max_distance)
+        while len(pending):
+            for i in range(0, len(pending), chunksize):
+                q = pending[i:i + chunksize]
+                qi, si, d = self._pairs(lat[q], lon[q], radius)
+                # by query then distance, one float key sorts faster than
+                # lexsort and resolves distances to ~1e-10 of radius
+                order = np.argsort(qi + d / (1.001 * radius))
+                qi, si, d = qi[order], si[order], d[order]
+                counts = np.bincount(qi, minlength=len(q))
+                rank = np.arange(len(qi)) - np.repeat(np.cumsum(counts) -
+                                                      counts, counts)
+                # a query is done once k stations are within the radius,
+                # nothing outside it can be nearer
+                done = (counts >= k) | (radius >= max_distance)
+                keep = (rank < k) & done[qi]
+                station[q[qi[keep]], rank[keep]] = si[keep]
+                distance[q[qi[keep]], rank[keep]] = d[keep]
+                pending[i:i + chunksize][done] = -1
+            pending = pending[pending >= 0]
+            radius = min(np.sqrt(2) * radius, max_distance)
+        return station, distance
+
+
+def brute_force_within(registry, lat, lon, radius):
+    """All (query, station) pairs within radius, comparing every pair."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = (np.asarray(lon, dtype=np.float64) + 180) % 360 - 180
+    pairs = set()
+    for number, (block, _, _, _, _) in registry.zones.items():
+        easting, northing = registry._project(lat, lon, number)
+        d = np.hypot(registry.easting[block][None, :] - easting[:, None],
+                     registry.northing[block][None, :] - northing[:, None])
+        qi, si = np.nonzero(d <= radius)
+        pairs.update(zip(qi.tolist(), (si + block.start).tolist()))
+    return pairs
+
+
+def haversine(lat1, lon1, lat2, lon2, R=6_371_008.8):
+    """Great circle distance in m on a sphere of radius R."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2)**2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2)
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def flight_tracks(npoints, ntracks, rng, lat_range, lon_range):
+    """Random straight tracks of positions 100 m apart, for the benchmark."""
+    per_track = npoints // ntracks
+    lat0 = rng.uniform(*lat_range, ntracks)[:, None]
+    lon0 = rng.uniform(*lon_range, ntracks)[:, None]
+    heading = rng.uniform(0, 2 * np.pi, ntracks)[:, None]
+    s = 100.0 * np.arange(per_track)[None, :]
+    lat = lat0 + s * np.cos(heading) / M_PER_DEG
+    lon = lon0 + s * np.sin(heading) / (M_PER_DEG * np.cos(np.radians(lat)))
+    return lat.ravel(), lon.ravel()
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    # Alaska, across UTM zones 3 to 7
+    lat_range, lon_range = (58.0, 70.0), (-166.0, -134.0)
+    nstations, npoints, radius = 10_000, 1_000_000, 10e3
+
+    ids = np.arange(15_000_000, 15_000_000 + nstations)
+    start = time.time()
+    registry = StationRegistry(ids, rng.uniform(*lat_range, nstations),
+                               rng.uniform(*lon_range, nstations),
+                               cell=radius)
+    print(f"build: {nstations} stations in {len(registry.zones)} zones "
+          f"in {time.time() - start:.3f}s")
+
+    lat, lon = flight_tracks(npoints, 200, rng, lat_range, lon_range)
+
+    start = time.time()
+    query, station, distance = registry.within(lat, lon, radius)
+    elapsed = time.time() - start
+    print(f"within {radius / 1e3:.0f} km: {len(lat)} points in "
+          f"{elapsed:.2f}s ({len(lat) / elapsed:.3g} points/s), "
+          f"{len(query)} matches")
+
+    start = time.time()
+    near, near_distance = registry.nearest(lat, lon, k=3)
+    elapsed = time.time() - start
+    print(f"nearest 3: {len(lat)} points in {elapsed:.2f}s "
+          f"({len(lat) / elapsed:.3g} points/s)")
+
+    # against every pair for a sample of the queries
+    sample = rng.choice(len(lat), 2000, replace=False)
+    start = time.time()
+    expected = brute_force_within(registry, lat[sample], lon[sample], radius)
+    brute = (time.time() - start) * len(lat) / len(sample)
+    found = set(zip(*registry.within(lat[sample], lon[sample], radius)[:2]))
+    found = {(int(q), int(s)) for q, s in found}
+    assert found == expected, "within differs from brute force"
+    print(f"brute force: {len(expected)} matches agree, extrapolated "
+          f"{brute:.1f}s for all {len(lat)} points")
+
+    # the nearest station, where one is within radius, is the closest
+    # brute force match
+    closest = {}
+    for q, st in expected:
+        d = np.hypot(*(registry._project(lat[sample[[q]]], lon[sample[[q]]],
+                                         int(registry.zone[st]))[c]
+                       - getattr(registry, name)[st]
+                       for c, name in [(0, "easting"), (1, "northing")]))[0]
+        if d < closest.get(q, (np.inf,))[0]:
+            closest[q] = (d, st)
+    assert all(near[sample[q], 0] == st for q, (_, st) in closest.items())
+    print(f"nearest agrees with brute force for {len(closest)} points")
+
+    # nearest against haversine, stations in other zones included
+    true = haversine(lat[sample, None], lon[sample, None],
+                     registry.lat[near[sample]], registry.lon[near[sample]])
+    print("nearest vs haversine, max relative difference: "
+          f"{np.abs(near_distance[sample] / true - 1).max():.2e}")
+    crossings = registry.zone[near[:, 0]] != LLtoUTM_batch(23, lat, lon)[2]
+    print(f"{crossings.sum()} points have their nearest station in another "
+          f"zone")
@@ -1,4 +1,8 @@
-from math import pi, sin, cos, tan, sqrt
+from collections import namedtuple
+from functools import lru_cache
+from math import pi
+
+import numpy as np
 
 rad2deg = 180.0 / pi
 EquatorialRadius = 0
@@ -31,68 +35,165 @@ ellipsoid = {
     "WGS-84": (6378137, 0.00669438)
 }
 
-def UTMtoLL(ReferenceEllipsoid, northing, easting, zone,):
+k0 = 0.9996
+
+# Per-ellipsoid constants that do not depend on the point being converted.
+# M1-M4 are the meridional arc series coefficients used by LLtoUTM.
+EllipsoidConstants = namedtuple(
+    "EllipsoidConstants", ["a", "eccSquared", "eccPrimeSquared", "e1",
+                           "mu_denom", "M1", "M2", "M3", "M4"])
 
-    # converts UTM coords to lat/long.  Equations from USGS Bulletin 1532
-    # East Longitudes are positive, West longitudes are negative.
-    # North latitudes are positive, South latitudes are negative
-    # Lat and Long are in decimal degrees.
-    # Written by Chuck Gantz- chuck.gantz@globalstar.com
-    # Converted to Python by Russ Nelson <nelson@crynwr.com>
 
-    k0 = 0.9996
-    for i in range(len(ellipsoid)):
-        if i == int(ReferenceEllipsoid):
-            key_elips = list(ellipsoid.keys())[i-1]
+@lru_cache(maxsize=None)
+def ellipsoid_constants(ReferenceEllipsoid):
+    """
+    Look up an ellipsoid and precompute its projection constants once.
+
+    parameters
+    ReferenceEllipsoid (int or str): 1-based index into `ellipsoid`
+        (23 is WGS-84) or the ellipsoid name
+
+    returns
+    EllipsoidConstants: a, eccSquared, eccPrimeSquared, e1, the
+        denominator of mu and the meridional arc coefficients M1-M4
+    """
+    if isinstance(ReferenceEllipsoid, str):
+        key_elips = ReferenceEllipsoid
+    else:
+        index = int(ReferenceEllipsoid)
+        if not 1 <= index <= len(ellipsoid):
+            raise ValueError(
+                f"ReferenceEllipsoid must be in 1-{len(ellipsoid)}, "
+                f"got {ReferenceEllipsoid}")
+        key_elips = list(ellipsoid.keys())[index - 1]
     a = ellipsoid[key_elips][EquatorialRadius]
     eccSquared = ellipsoid[key_elips][eccentricitySquared]
-    e1 = (1 - sqrt(1 - eccSquared)) / (1 + sqrt(1 - eccSquared))
-    # NorthernHemisphere; //1 for northern hemispher, 0 for southern
+    e1 = (1 - np.sqrt(1 - eccSquared)) / (1 + np.sqrt(1 - eccSquared))
+    eccPrimeSquared = (eccSquared) / (1 - eccSquared)
+    M1 = (1 - eccSquared / 4 - 3 * eccSquared ** 2 /
+          64 - 5 * eccSquared ** 3 / 256)
+    M2 = (3 * eccSquared / 8 + 3 * eccSquared ** 2 / 32 +
+          45 * eccSquared ** 3 / 1024)
+    M3 = 15 * eccSquared ** 2 / 256 + 45 * eccSquared ** 3 / 1024
+    M4 = 35 * eccSquared ** 3 / 3072
+    mu_denom = a * M1
+    return EllipsoidConstants(a, eccSquared, eccPrimeSquared, e1, mu_denom,
+                              M1, M2, M3, M4)
 
-    x = easting - 500000.0  # remove 500,000 meter offset for longitude
-    y = northing
 
-    ZoneLetter = zone[-1]
-    ZoneNumber = int(zone[:-1])
-    if not ZoneLetter >= 'N':
-        y -= 10000000.0         # remove 10,000,000 meter offset used for S
+def _parse_zones(zone):
+    """
+    Split UTM zone strings (e.g. "6N") into zone numbers and a northern
+    hemisphere mask. Each distinct zone string is only parsed once.
+    """
+    zone = np.asarray(zone, dtype=str)
+    if zone.size == 0:
+        return (np.empty(zone.shape, dtype=np.int64),
+                np.empty(zone.shape, dtype=bool))
+    # Pack the characters of each zone into one integer so that finding the
+    # distinct zones is an integer sort rather than a string sort
+    flat = np.ascontiguousarray(zone.reshape(-1))
+    codes = flat.view(np.uint32).reshape(zone.size, -1)
+    # Drop the padding columns of wide string dtypes
+    codes = codes[:, :np.count_nonzero(codes.any(axis=0))]
+    if codes.shape[1] <= 7 and not (codes > 0x7f).any():
+        key = np.zeros(zone.size, dtype=np.int64)
+        for column in codes.T:
+            key = (key << 8) | column
+    else:
+        key = flat
+    _, first, inverse = np.unique(key, return_index=True,
+                                  return_inverse=True)
+    unique_zones = flat[first]
+    numbers = np.array([int(z[:-1]) for z in unique_zones], dtype=np.int64)
+    northern = np.array([z[-1] >= 'N' for z in unique_zones], dtype=bool)
+    inverse = inverse.reshape(zone.shape)
+    return numbers[inverse], northern[inverse]
+
+
+def UTMtoLL_batch(ReferenceEllipsoid, northing, easting, zone):
+    """
+    Convert arrays of UTM coordinates to lat/long in one vectorized pass.
+    Zones may differ from point to point and mix hemispheres.
+
+    parameters
+    ReferenceEllipsoid (int or str): see `ellipsoid_constants`
+    northing (np.array): UTM northings in m
+    easting (np.array): UTM eastings in m
+    zone (np.array or str): zone strings such as "6N", broadcast against
+        northing and easting
+
+    returns
+    Lat (np.array): latitudes in decimal degrees
+    Long (np.array): longitudes in decimal degrees
+    """
+    const = ellipsoid_constants(ReferenceEllipsoid)
+    a = const.a
+    eccSquared = const.eccSquared
+    eccPrimeSquared = const.eccPrimeSquared
+    e1 = const.e1
+
+    ZoneNumber, northern = _parse_zones(zone)
+    northing, easting, ZoneNumber, northern = np.broadcast_arrays(
+        np.asarray(northing, dtype=np.float64),
+        np.asarray(easting, dtype=np.float64), ZoneNumber, northern)
+
+    x = easting - 500000.0  # remove 500,000 meter offset for longitude
+    # remove 10,000,000 meter offset used for southern hemisphere
+    y = np.where(northern, northing, northing - 10000000.0)
 
     # +3 puts origin in middle of zone
     LongOrigin = (ZoneNumber - 1) * 6 - 180 + 3
 
-    eccPrimeSquared = (eccSquared) / (1 - eccSquared)
-
-    M = y / k0
-    mu = M / (a * (1 - eccSquared / 4 - 3 * eccSquared ** 2 /
-                   64 - 5 * eccSquared ** 3 / 256))
+    mu = y / k0 / const.mu_denom
 
-    phi1Rad = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * sin(2 * mu) +
+    phi1Rad = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * np.sin(2 * mu) +
                (21 * e1 * e1 / 16 - 55 * e1 ** 4 / 32) *
-               sin(4 * mu) + (151 * e1 ** 3/ 96) * sin(6 * mu))
+               np.sin(4 * mu) + (151 * e1 ** 3 / 96) * np.sin(6 * mu))
 
-    N1 = a / sqrt(1 - eccSquared * sin(phi1Rad) ** 2)
-    T1 = tan(phi1Rad) ** 2
-    C1 = eccPrimeSquared * cos(phi1Rad) ** 2
-    R1 = a * (1 - eccSquared) / pow(1 - eccSquared *
-                                    sin(phi1Rad) ** 2, 1.5)
+    sin_phi1 = np.sin(phi1Rad)
+    cos_phi1 = np.cos(phi1Rad)
+    tan_phi1 = np.tan(phi1Rad)
+    W = 1 - eccSquared * sin_phi1 * sin_phi1
+    N1 = a / np.sqrt(W)
+    T1 = tan_phi1 * tan_phi1
+    C1 = eccPrimeSquared * cos_phi1 * cos_phi1
+    R1 = a * (1 - eccSquared) / (W * np.sqrt(W))
     D = x / (N1 * k0)
+    D2 = D * D
 
-    Lat = phi1Rad - (N1 * tan(phi1Rad) / R1) *\
-        (D * D / 2 -
-         (5 + 3 * T1 + 10 * C1 - 4 * C1 ** 2 - 9 * eccPrimeSquared) *
-         D ** 4 / 24 + (61 + 90 * T1 + 298 * C1 + 45 * T1 * T1 - 252 *
-                               eccPrimeSquared - 3 * C1 ** 2) *
-        D ** 6 / 720)
+    Lat = phi1Rad - (N1 * tan_phi1 / R1) *\
+        (D2 / 2 -
+         (5 + 3 * T1 + 10 * C1 - 4 * C1 * C1 - 9 * eccPrimeSquared) *
+         D2 * D2 / 24 + (61 + 90 * T1 + 298 * C1 + 45 * T1 * T1 - 252 *
+                               eccPrimeSquared - 3 * C1 * C1) *
+        D2 * D2 * D2 / 720)
     Lat = Lat * rad2deg
 
-    Long = (D - (1 + 2 * T1 + C1) * D ** 3 / 6 +
-            (5 - 2 * C1 + 28 * T1 - 3 * C1 ** 2 + 8 *
-             eccPrimeSquared + 24 * T1 ** 2) *
-            D ** 5 / 120) / cos(phi1Rad)
+    Long = D * (1 - (1 + 2 * T1 + C1) * D2 / 6 +
+                (5 - 2 * C1 + 28 * T1 - 3 * C1 * C1 + 8 *
+                 eccPrimeSquared + 24 * T1 * T1) *
+                D2 * D2 / 120) / cos_phi1
     Long = LongOrigin + Long * rad2deg
     return (Lat, Long)
 
-ellips = 23
-z = str(6) + "N"
-(lat, lon) = UTMtoLL(ellips, 7193122.574733158, 459708.12017047824 , z)  # UTMtoLL(ellipsoid, n, e, z)
-print("  UTMtoLL lon / lat = ",lon,lat)
+
+def UTMtoLL(ReferenceEllipsoid, northing, easting, zone,):
+
+    # converts UTM coords to lat/long.  Equations from USGS Bulletin 1532
+    # East Longitudes are positive, West longitudes are negative.
+    # North latitudes are positive, South latitudes are negative
+    # Lat and Long are in decimal degrees.
+    # Written by Chuck Gantz- chuck.gantz@globalstar.com
+    # Converted to Python by Russ Nelson <nelson@crynwr.com>
+    # Single point wrapper around UTMtoLL_batch
+
+    Lat, Long = UTMtoLL_batch(ReferenceEllipsoid, northing, easting, zone)
+    return (float(Lat), float(Long))
+
+
+if __name__ == "__main__":
+    ellips = 23
+    z = str(6) + "N"
+    (lat, lon) = UTMtoLL(ellips, 7193122.574733158, 459708.12017047824 , z)  # UTMtoLL(ellipsoid, n, e, z)
+    print("  UTMtoLL lon / lat = ",lon,lat)
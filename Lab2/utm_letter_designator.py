@@ -1,5 +1,30 @@
 import numpy as np
 
+# Latitude band table, built once at import. Bands are 8 degrees wide from
+# 80S, except X which runs from 72N to 84N (84.001 so that 84 is included).
+band_edges = np.array(list(np.arange(-80, 80, 8)) + [84.001])
+designation_codes = np.array(["C","D","E","F","G","H","J","K","L","M","N"
+                              ,"P","Q","R","S","T","U","V","W","X"])
+
+
+def utm_letter_designator_array(lat):
+    """
+    Determines the UTM letter designator for an array of latitudes with a
+    binary search of the band table. Out of range latitudes get 'Z'.
+
+    Args:
+    lat (np.array): latitudes in decimal degrees
+
+    Returns:
+    np.array: UTM letter designators
+    """
+    lat = np.asarray(lat, dtype=float)
+    index = np.searchsorted(band_edges, lat, side="right") - 1
+    inside = (index >= 0) & (index < len(designation_codes))
+    letters = designation_codes[np.clip(index, 0, len(designation_codes) - 1)]
+    return np.where(inside, letters, "Z")
+
+
 def utm_letter_designator(lat):
     """
     Determines the UTM letter designator a given latitude. Returns 'Z' if 
@@ -12,22 +37,11 @@ def utm_letter_designator(lat):
     Returns:
     str: UTM letter designator
     """
-    
-    latitudes = [84.001] + list(np.arange(72, -81, -8))
-    designation_codes = ["X","W","V","U","T","S","R","Q","P","N","M"
-                         ,"L","K","J","H","G","F","E","D","C"]
-    utm_designations = {}
-    for i in range(len(latitudes)-1):
-        utm_designations[designation_codes[i]] = (latitudes[i], latitudes[i+1])
-        
-    for designation, coords in utm_designations.items():
-        lat_max, lat_min = coords
-        if lat_min <= lat < lat_max:
-            return designation
-    else:
-        return "Z"    
+    return str(utm_letter_designator_array(float(lat)))
+
 
 if __name__ == "__main__":
     latitudes = [85, 84, 64, 0, -1, -79.9999, 200]
     for latitude in latitudes:
         print(f"lat {latitude} = {utm_letter_designator(latitude)}")
+    print(utm_letter_designator_array(latitudes))
@@ -0,0 +1,316 @@
+import numpy as np
+
+"""
+Rolling statistics and flood event detection for stream guage data. All
+functions take plain arrays (e.g. StreamGuage.data) and run in O(n) time
+whatever the window length: mean and std use cumulative sums, min and max
+use the van Herk/Gil-Werman block prefix/suffix algorithm.
+Windows are trailing, value i covers data[i - window + 1:i + 1], and the
+first window - 1 values are NaN. Mean and std skip NaN samples (e.g. gaps
+left by resample) and are NaN only for windows without any valid sample.
+"""
+
+
+def _check_window(data, window):
+    data = np.asarray(data, dtype=np.float64)
+    window = int(window)
+    if window < 1:
+        raise ValueError("window must be at least 1, got {}".format(window))
+    return data, window
+
+
+def rolling_mean(data, window):
+    """
+    Trailing rolling mean
+
+    parameters
+    data (np.array): guage data
+    window (int): window length in samples
+
+    returns
+    np.array: rolling mean of the valid samples, NaN until the window is
+        full and where it only holds NaN
+    """
+    data, window = _check_window(data, window)
+    out = np.full(len(data), np.nan)
+    if window > len(data):
+        return out
+    valid = ~np.isnan(data)
+    csum = np.cumsum(np.where(valid, data, 0))
+    count = np.cumsum(valid)
+    out[window - 1:] = csum[window - 1:]
+    out[window:] -= csum[:-window]
+    count = count[window - 1:] - np.append(0, count[:-window])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[window - 1:] /= count
+    out[window - 1:][count == 0] = np.nan
+    return out
+
+
+def rolling_std(data, window):
+    """
+    Trailing rolling (population) standard deviation
+
+    parameters
+    data (np.array): guage data
+    window (int): window length in samples
+
+    returns
+    np.array: rolling standard deviation of the valid samples, NaN until
+        the window is full and where it only holds NaN
+    """
+    data, window = _check_window(data, window)
+    if window > len(data):
+        return np.full(len(data), np.nan)
+    # removing the overall mean first keeps the sum of squares from
+    # cancelling catastrophically for large offsets such as guage heights.
+    # NaN stays NaN in the squares, so rolling_mean skips it there too
+    valid = data[~np.isnan(data)]
+    centered = data - (valid.mean() if len(valid) else 0.0)
+    mean = rolling_mean(centered, window)
+    mean_sq = rolling_mean(centered * centered, window)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0))
+
+
+def _rolling_extreme(data, window, ufunc, fill):
+    data, window = _check_window(data, window)
+    n = len(data)
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+
+    # split into blocks of length window, running extreme from the start
+    # (prefix) and from the end (suffix) of each block
+    nblocks = -(-n // window)
+    padded = np.full(nblocks * window, fill)
+    padded[:n] = data
+    blocks = padded.reshape(nblocks, window)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    # a window [j, i] spans at most two blocks: suffix of j's block and
+    # prefix of i's block
+    end = np.arange(window - 1, n)
+    out[window - 1:] = ufunc(suffix[end - window + 1], prefix[end])
+    return out
+
+
+def rolling_max(data, window):
+    """
+    Trailing rolling maximum
+
+    parameters
+    data (np.array): guage data
+    window (int): window length in samples
+
+    returns
+    np.array: rolling maximum, NaN until the window is full
+    """
+    return _rolling_extreme(data, window, np.maximum, -np.inf)
+
+
+def rolling_min(data, window):
+    """
+    Trailing rolling minimum
+
+    parameters
+    data (np.array): guage data
+    window (int): window length in samples
+
+    returns
+    np.array: rolling minimum, NaN until the window is full
+    """
+    return _rolling_extreme(data, window, np.minimum, np.inf)
+
+
+def find_runs(mask, min_length=1):
+    """
+    Start and end (inclusive) indices of runs of True in mask
+
+    parameters
+    mask (np.array bool): condition per sample
+    min_length (int): drop runs shorter than this many samples
+
+    returns
+    starts (np.array), ends (np.array)
+    """
+    mask = np.asarray(mask, dtype=bool)
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = ends - starts + 1 >= min_length
+    return starts[keep], ends[keep]
+
+
+def _events(data, mask, min_length):
+    """(nevents, 3) array of start, end and peak index of each run"""
+    starts, ends = find_runs(mask, min_length)
+    peaks = np.array([s + np.argmax(data[s:e + 1])
+                      for s, e in zip(starts, ends)], dtype=np.int64)
+    return np.column_stack([starts, ends, peaks]).astype(np.int64)
+
+
+def threshold_events(data, threshold, min_length=1):
+    """
+    Find events where the guage data is at or above a threshold
+
+    parameters
+    data (np.array): guage data
+    threshold (float): level in the units of data
+    min_length (int): minimum event length in samples
+
+    returns
+    np.array: (nevents, 3) start, end (inclusive) and peak indices
+    """
+    data = np.asarray(data, dtype=np.float64)
+    return _events(data, data >= threshold, min_length)
+
+
+# samples per block of the event searches, and rows gathered at once
+BLOCK = 64
+CHUNK = 2**14
+
+
+def _first_in_blocks(blocks, b, lo, levels):
+    """First column c >= lo[i] of blocks[b[i]] below levels[i], -1 if none."""
+    cols = np.arange(blocks.shape[1])
+    out = np.empty(len(b), dtype=np.int64)
+    for i in range(0, len(b), CHUNK):
+        s = slice(i, i + CHUNK)
+        below = (blocks[b[s]] < levels[s, None]) & (cols >= lo[s, None])
+        out[s] = np.where(below.any(axis=1), below.argmax(axis=1), -1)
+    return out
+
+
+def _argmax_in_blocks(blocks, b, lo, hi):
+    """Column of the first maximum of blocks[b[i], lo[i]:hi[i] + 1]."""
+    cols = np.arange(blocks.shape[1])
+    out = np.empty(len(b), dtype=np.int64)
+    for i in range(0, len(b), CHUNK):
+        s = slice(i, i + CHUNK)
+        rows = blocks[b[s]]
+        rows[(cols < np.reshape(lo[s], (-1, 1))) |
+             (cols > np.reshape(hi[s], (-1, 1)))] = -np.inf
+        out[s] = rows.argmax(axis=1)
+    return out
+
+
+def _blocks(data, fill, block):
+    """data padded with fill to whole blocks, (nblocks, block)"""
+    nblocks = -(-len(data) // block)
+    padded = np.full(nblocks * block, fill)
+    padded[:len(data)] = data
+    return padded.reshape(nblocks, block)
+
+
+def _first_below(data, after, levels, block=BLOCK):
+    """
+    First index j > after[i] with data[j] < levels[i], len(data) if there
+    is none. The rest of the block holding after[i] + 1 is searched
+    directly, the first later block whose minimum is below the level is
+    found with the same search on the block minima, then searched.
+    O(n + len(after) * block * log(n) / log(block)) time, O(n) memory.
+    """
+    n = len(data)
+    # nothing is below a NaN level and a NaN sample is below nothing
+    levels = np.where(np.isnan(levels), -np.inf, levels)
+    blocks = _blocks(np.where(np.isnan(data), np.inf, data), np.inf, block)
+    first = np.full(len(after), n, dtype=np.int64)
+    q = np.flatnonzero(np.asarray(after) + 1 < n)
+    start = after[q] + 1
+    col = _first_in_blocks(blocks, start // block, start % block, levels[q])
+    hit = col >= 0
+    first[q[hit]] = start[hit] // block * block + col[hit]
+
+    q, start = q[~hit], start[~hit]
+    if len(q) and len(blocks) > 1:
+        b = _first_below(blocks.min(axis=1), start // block, levels[q],
+                         block)
+        found = b < len(blocks)
+        q, b = q[found], b[found]
+        first[q] = b * block + _first_in_blocks(
+            blocks, b, np.zeros(len(b), dtype=np.int64), levels[q])
+    return first
+
+
+def _range_argmax(data, starts, ends, block=BLOCK):
+    """
+    Index of the first maximum of data[starts[i]:ends[i] + 1], NaN counts
+    as the maximum like in np.argmax. A range is split into the ends of
+    its first and last block, searched directly, and the whole blocks in
+    between, whose maximum is found with the same search on the block
+    maxima. Time and memory as in _first_below.
+    """
+    starts, ends = np.asarray(starts), np.asarray(ends)
+    blocks = _blocks(data, -np.inf, block)
+    first_block, last_block = starts // block, ends // block
+    out = np.empty(len(starts), dtype=np.int64)
+
+    same = first_block == last_block
+    out[same] = first_block[same] * block + _argmax_in_blocks(
+        blocks, first_block[same], starts[same] % block, ends[same] % block)
+
+    d = np.flatnonzero(~same)
+    fb, lb = first_block[d], last_block[d]
+    candidates = np.full((len(d), 3), -1, dtype=np.int64)
+    candidates[:, 0] = fb * block + _argmax_in_blocks(
+        blocks, fb, starts[d] % block, np.full(len(d), block - 1))
+    candidates[:, 2] = lb * block + _argmax_in_blocks(
+        blocks, lb, np.zeros(len(d), dtype=np.int64), ends[d] % block)
+    m = np.flatnonzero(lb - fb > 1)
+    if len(m):
+        b = _range_argmax(blocks.max(axis=1), fb[m] + 1, lb[m] - 1, block)
+        candidates[m, 1] = b * block + _argmax_in_blocks(
+            blocks, b, np.zeros(len(b), dtype=np.int64),
+            np.full(len(b), block - 1))
+    # candidates are in order, so ties go to the first as in np.argmax
+    values = np.where(candidates >= 0, blocks.ravel()[candidates], -np.inf)
+    out[d] = candidates[np.arange(len(d)), values.argmax(axis=1)]
+    return out
+
+
+def rise_events(time, data, rate, window=1, min_length=1):
+    """
+    Find events where the guage data rises at or faster than a given rate.
+    The rise at sample i is measured from sample i - window. The peak is
+    the highest sample from the start of the rise until the level drops
+    back below its value at the start of the rise.
+
+    parameters
+    time (np.array): sample times in minutes
+    data (np.array): guage data
+    rate (float): rate of rise in units of data per minute
+    window (int): number of samples the rise is measured over
+    min_length (int): minimum number of samples rising at rate
+
+    returns
+    np.array: (nevents, 3) start, end (inclusive) and peak indices
+    """
+    time = np.asarray(time, dtype=np.float64)
+    data, window = _check_window(data, window)
+    rising = np.zeros(len(data), dtype=bool)
+    if window < len(data):
+        dt = time[window:] - time[:-window]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rising[window:] = (data[window:] - data[:-window]) / dt >= rate
+
+    starts, ends = find_runs(rising, min_length)
+    starts = np.maximum(starts - window, 0)  # include the base of the rise
+    # the event lasts until the level falls back to its starting value
+    end = _first_below(data, ends, data[starts]) - 1
+    return np.column_stack([starts, end, _range_argmax(data, starts, end)]
+                           ).astype(np.int64)
+
+
+if __name__ == "__main__":
+    import time
+
+    # a year of 1 minute samples rising in steps that never fall back, so
+    # every event stays open to the end: time should double with n
+    for n in [131_400, 262_800, 525_600]:
+        minutes = np.arange(n, dtype=np.float64)
+        steps = np.floor(minutes / 10)
+        start = time.perf_counter()
+        found = rise_events(minutes, steps, 0.5)
+        print(f"rise_events: {n} samples, {len(found)} events in "
+              f"{time.perf_counter() - start:.3f}s")
@@ -0,0 +1,128 @@
+import numpy as np
+
+"""
+Resample stream guage records onto a common time grid. Gaps in a record
+are marked with NaN instead of being interpolated across, so records of
+different lengths and sampling can be stacked into one
+(stations x time) array. Guage times count minutes from each guage's own
+start month, so time_grid and align put every record on one absolute
+base, minutes since 1970-01-01, before stacking.
+"""
+
+
+def absolute_time(guage):
+    """Guage sample times in minutes since 1970-01-01"""
+    return guage.time + guage.reference_minute()
+
+
+def time_grid(guages, step):
+    """
+    Common time grid covering all guages
+
+    parameters
+    guages (list): StreamGuage objects with time filled
+    step (float): grid spacing in minutes
+
+    returns
+    grid (np.array): grid times in minutes since 1970-01-01
+    """
+    start = min(g.time[0] + g.reference_minute() for g in guages)
+    end = max(g.time[-1] + g.reference_minute() for g in guages)
+    return start + step * np.arange(int(np.floor((end - start) / step)) + 1)
+
+
+def default_max_gap(time):
+    """Largest spacing not treated as a gap: 1.5x the median spacing"""
+    if len(time) < 2:
+        return 0.0
+    return 1.5 * np.median(np.diff(time))
+
+
+def resample(time, data, grid, method="linear", max_gap=None):
+    """
+    Resample one record onto a uniform grid
+
+    parameters
+    time (np.array): sample times in minutes, increasing
+    data (np.array): sample values
+    grid (np.array): uniform grid times in minutes
+    method (str): "linear" interpolation, or "mean" / "max" of the
+        samples in each [grid[i], grid[i] + step) block
+    max_gap (float): sample spacing in minutes above which the record
+        has a gap, defaults to 1.5x the median spacing. Only used by
+        "linear", empty blocks are always gaps.
+
+    returns
+    out (np.array): resampled values, NaN in gaps and outside the record
+    """
+    time = np.asarray(time, dtype=np.float64)
+    data = np.asarray(data, dtype=np.float64)
+    grid = np.asarray(grid, dtype=np.float64)
+    finite = np.isfinite(data)
+    if not finite.all():
+        time, data = time[finite], data[finite]
+
+    out = np.full(len(grid), np.nan)
+    if len(time) == 0:
+        return out
+
+    if method == "linear":
+        if max_gap is None:
+            max_gap = default_max_gap(time)
+        right = np.searchsorted(time, grid, side="left")
+        exact = (right < len(time)) & (time[np.minimum(right, len(time) - 1)]
+                                       == grid)
+        inside = (right > 0) & (right < len(time))
+        r = np.clip(right, 1, len(time) - 1)
+        spacing = time[r] - time[r - 1]
+        valid = exact | (inside & (spacing <= max_gap))
+        out[valid] = np.interp(grid[valid], time, data)
+        return out
+
+    if len(grid) < 2:
+        raise ValueError("Block resampling needs at least two grid points")
+    step = grid[1] - grid[0]
+    bins = np.floor((time - grid[0]) / step).astype(np.int64)
+    keep = (bins >= 0) & (bins < len(grid))
+    bins, values = bins[keep], data[keep]
+    if len(bins) == 0:
+        return out
+
+    if method == "mean":
+        counts = np.bincount(bins, minlength=len(grid))
+        sums = np.bincount(bins, weights=values, minlength=len(grid))
+        filled = counts > 0
+        out[filled] = sums[filled] / counts[filled]
+    elif method == "max":
+        # bins are sorted, so each block is a contiguous run
+        starts = np.flatnonzero(np.diff(bins, prepend=-1))
+        out[bins[starts]] = np.maximum.reduceat(values, starts)
+    else:
+        raise ValueError("Unknown resampling method {}".format(method))
+    return out
+
+
+def align(guages, step, method="linear", max_gap=None, grid=None):
+    """
+    Resample many guages onto one grid and stack them
+
+    parameters
+    guages (list): StreamGuage objects with time and data filled
+    step (float): grid spacing in minutes
+    method (str): see resample
+    max_gap (float): see resample
+    grid (np.array): grid in minutes since 1970-01-01 to use instead of
+        one covering all guages
+
+    returns
+    grid (np.array): grid times in minutes since 1970-01-01
+    stack (np.array): (stations x time) resampled data, NaN in gaps
+    station_ids (list): station id of each row
+    """
+    if grid is None:
+        grid = time_grid(guages, step)
+    stack = np.empty((len(guages), len(grid)))
+    for i, guage in enumerate(guages):
+        stack[i] = resample(absolute_time(guage), guage.data, grid, method,
+                            max_gap)
+    return grid, stack, [g.station_id for g in guages]
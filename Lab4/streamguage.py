@@ -1,50 +1,216 @@
+import argparse
+import glob
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+
+def _digits(buf, start, n):
+    """Read n ASCII digits starting at each index in start as integers."""
+    value = np.zeros(len(start), dtype=np.int64)
+    for k in range(n):
+        value = value * 10 + (buf[start + k] - ord("0"))
+    return value
+
+
+def parse_rdb_block(block, reference):
+    """
+    Parse a block of complete USGS RDB data lines straight into arrays
+
+    parameters
+    block (bytes): tab separated data lines, each ending in a newline
+    reference (int): minutes since 1970-01-01 that time is measured from
+
+    returns
+    time (np.array int64): minutes since reference
+    hgt (np.array float64): guage height
+    """
+    if not block.endswith(b"\n"):
+        block += b"\n"
+    buf = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord("\n"))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    starts = starts[ends - starts > 1]  # skip blank lines
+
+    # datetime is the third column, "YYYY-MM-DD HH:MM" at fixed offsets
+    seps = np.flatnonzero((buf == ord("\t")) | (buf == ord(" ")))
+    date = seps[np.searchsorted(seps, starts) + 1] + 1
+    year = _digits(buf, date, 4)
+    month = _digits(buf, date + 5, 2)
+    day = _digits(buf, date + 8, 2)
+    hour = _digits(buf, date + 11, 2)
+    minute = _digits(buf, date + 14, 2)
+
+    months = (year - 1970) * 12 + month - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]")
+    days = days.astype(np.int64) + day - 1
+    time = days * 24 * 60 + hour * 60 + minute - reference
+
+    hgt = np.loadtxt(io.BytesIO(block), usecols=5, dtype=np.float64,
+                     ndmin=1)
+    return time, hgt
+
+
 class StreamGuage:
-    time = []
-    data = []
-    units="ft"
+    __slots__ = ("fid", "station_id", "station_name", "starttime", "time",
+                 "data", "units")
+    default_units = "ft"
+    cache_dir = ".guage_cache"  # relative to the guage file, None disables
     
     def __init__(self, fid, station_id, station_name, starttime):
         self.fid = fid 
         self.station_id = station_id
         self.station_name = station_name
         self.starttime = starttime
+        self.time = np.empty(0, dtype=np.float64)
+        self.data = np.empty(0, dtype=np.float64)
+        self.units = self.default_units
+
+    @classmethod
+    def from_file(cls, fid):
+        """
+        Build a guage from the header of an RDB file: the station name from
+        the "# USGS <site_no> <name>" comment, the station id and start
+        time from the first data line
+        """
+        station_id, station_name, starttime = None, "", None
+        with open(fid) as f:
+            line = f.readline()
+            while line.startswith("#"):
+                words = line[1:].split()
+                if len(words) > 2 and words[0] == "USGS" and words[1].isdigit():
+                    station_name = " ".join(words[2:])
+                line = f.readline()
+            f.readline()  # column format line
+            line = f.readline().split()
+            if len(line) > 3:
+                station_id = line[1]
+                starttime = "{} {}".format(line[2], line[3])
+        if starttime is None:
+            raise ValueError("No data lines in guage file {}".format(fid))
+        return cls(fid, station_id, station_name, starttime)
+
+    def reference_minute(self):
+        """
+        Minutes since 1970-01-01 of day 0 of the start month, so that time
+        is DD * 24 * 60 + HH * 60 + MM within the start month
+        """
+        month = np.datetime64(self.starttime[:7], "M")
+        day0 = month.astype("datetime64[D]") - np.timedelta64(1, "D")
+        return int(day0.astype(np.int64)) * 24 * 60
+
+    def iter_guage_blocks(self, chunksize=2**20):
+        """
+        Stream USGS Guage data in blocks without loading the whole file
+
+        parameters
+        chunksize (int): approximate number of bytes read per block
+
+        returns
+        generator of (time, hgt): minutes since start of month (int64) and
+            guage height in ft (float64) for each block
+        """
+        reference = self.reference_minute()
+        with open(self.fid, "rb") as f:
+            # skip the comment lines and the column name and format lines
+            line = f.readline()
+            while line.startswith(b"#"):
+                line = f.readline()
+            f.readline()
+
+            while True:
+                lines = f.readlines(chunksize)
+                if not lines:
+                    break
+                yield parse_rdb_block(b"".join(lines), reference)
+
+    def cache_path(self):
+        """
+        Path of the binary cache for this guage file. The name is keyed by
+        the source path, size and modification time (and the start time
+        the timestamps are measured from), so editing the source text
+        invalidates the cache.
+        """
+        source = os.path.abspath(self.fid)
+        stat = os.stat(source)
+        key = "{}|{}|{}|{}".format(source, stat.st_size, stat.st_mtime_ns,
+                                   self.starttime)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(source))[0]
+        cache_dir = os.path.join(os.path.dirname(source), self.cache_dir)
+        return os.path.join(cache_dir, "{}-{}.npy".format(stem, digest))
 
-    def read_guage_file(self):
+    def write_cache(self, path):
+        """
+        Store time and data as one (2, N) float64 .npy file, replacing any
+        stale cache of the same guage file
+        """
+        cache_dir, name = os.path.split(path)
+        stem = name.rsplit("-", 1)[0]
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in os.listdir(cache_dir):
+            if old.rsplit("-", 1)[0] == stem and old != name:
+                os.remove(os.path.join(cache_dir, old))
+
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            np.save(f, np.vstack([self.time, self.data]))
+        os.replace(tmp, path)
+
+    def read_guage_file(self, chunksize=2**20, cache=True):
         """
         Read USGS Guage data and convert date and time to minutes since start
 
         parameters
         fid (str): path to data
+        chunksize (int): approximate number of bytes parsed at a time
+        cache (bool): load from / save to the binary cache in cache_dir
 
         returns
-        timestamps (list): minutes since 2024-09-01 00:00
+        timestamps (np.array): minutes since 2024-09-01 00:00
         hgt (np.array): guage height in ft
         """
-        date, time, hgt = np.loadtxt(self.fid, skiprows=28, usecols=[2,3,5], 
-                                        dtype=str).T
+        cache = cache and self.cache_dir is not None
+        if cache:
+            path = self.cache_path()
+            if os.path.exists(path):
+                # copy-on-write so the in-place operations never touch
+                # the cache file
+                cached = np.load(path, mmap_mode="c")
+                self.time, self.data = cached[0], cached[1]
+                return
+
+        blocks = list(self.iter_guage_blocks(chunksize))
+        if blocks:
+            time, hgt = zip(*blocks)
+        else:
+            time, hgt = [np.empty(0)], [np.empty(0)]
 
-        hgt = hgt.astype(float)
-        days = [float(d[-2:]) for d in date]  # get DD from YYYY-MM-DD
-        hours = [float(t.split(":")[0]) for t in time]  # get HH from HH:MM
-        mins = [float(t.split(":")[1]) for t in time]  # get MM from HH:MM
+        self.time = np.concatenate(time).astype(np.float64)
+        self.data = np.concatenate(hgt)
 
-        timestamps = []
-        for d, h, m in zip(days, hours, mins):
-            timestamp = (d * 24 * 60) + (h * 60) + m
-            timestamps.append(timestamp)
+        if cache:
+            try:
+                self.write_cache(path)
+            except OSError as e:
+                print("Could not write guage cache {}: {}".format(path, e))
 
-        self.time = timestamps
-        self.data = hgt
+    def plot(self, fname=None):
+        """
+        Plot the guage data
 
-    def plot(self):
+        parameters
+        fname (str): save the figure to this file instead of showing it
+        """
         plt.figure(figsize=(10, 5))
         plt.title("Stream Guage <{}> <{}> <{}> <{}> <{}>".format(
             self.station_id, self.station_name, self.starttime, 
-            max(self.data), self.units))
+            self.data.max(), self.units))
         plt.plot(self.time, self.data, c='k')
         datetime_object = datetime.strptime(self.starttime, '%Y-%m-%d %H:%M')
 
@@ -54,29 +220,49 @@ class StreamGuage:
 
         plt.xlabel("Time (minutes since start of {}-{})".format(year, month))
         plt.ylabel("Guage Height ({})".format(self.units))
-        plt.show()
+        if fname is None:
+            plt.show()
+        else:
+            plt.savefig(fname)
+            plt.close()
 
-    def convert(self):
+    def convert(self, copy=False):
         """
         Convert guage height from ft to m
+
+        parameters
+        copy (bool): allocate a new data array instead of converting in place
         """
-        self.data = self.data * 0.3048
+        if copy:
+            self.data = self.data * 0.3048
+        else:
+            self.data *= 0.3048
         self.units = "m"
 
-    def demean(self):
+    def demean(self, copy=False):
         """
         Demean the guage data
+
+        parameters
+        copy (bool): allocate a new data array instead of demeaning in place
         """
-        self.data = self.data - np.mean(self.data)
+        if copy:
+            self.data = self.data - np.mean(self.data)
+        else:
+            self.data -= np.mean(self.data)
     
-    def shift_time(self, shift):
+    def shift_time(self, shift, copy=False):
         """
         Shift the time by a certain amount. 
 
         parameters
         shift (float): amount to shift time in minutes
+        copy (bool): allocate a new time array instead of shifting in place
         """
-        self.time = [t + shift for t in self.time]
+        if copy:
+            self.time = self.time + shift
+        else:
+            self.time += shift
 
     def main(self):
         self.read_guage_file()   
@@ -88,19 +274,115 @@ class StreamGuage:
         self.plot()   
 
 class NOAAStreamGuage(StreamGuage):
-    units="m"
+    __slots__ = ()
+    default_units = "m"
 
-    def convert(self):
+    def convert(self, copy=False):
         pass
-    def read_guage_file(self):
-        super().read_guage_file()
+    def read_guage_file(self, chunksize=2**20, cache=True):
+        super().read_guage_file(chunksize, cache)
         print("I am a NOAA stream gauge")
 
 
+def process_guage_file(fid, guage_class=StreamGuage, shift=-100, outdir=None):
+    """
+    Read one guage file and apply the convert, demean, shift_time chain
+
+    parameters
+    fid (str): path to data
+    guage_class (type): StreamGuage or NOAAStreamGuage
+    shift (float): time shift in minutes
+    outdir (str): if given, save before/after figures here (headless)
+
+    returns
+    StreamGuage: the processed guage
+    """
+    guage = guage_class.from_file(fid)
+    guage.read_guage_file()
+    stem = os.path.splitext(os.path.basename(fid))[0]
+    if outdir is not None:
+        guage.plot(os.path.join(outdir, stem + "_raw.png"))
+
+    guage.convert()
+    guage.demean()
+    guage.shift_time(shift)
+    if outdir is not None:
+        guage.plot(os.path.join(outdir, stem + "_processed.png"))
+
+    # plain arrays rather than views of the cache memmap for pickling
+    guage.time = np.asarray(guage.time)
+    guage.data = np.asarray(guage.data)
+    return guage
+
+
+def _init_headless():
+    plt.switch_backend("Agg")
+
+
+def ingest(fids, guage_class=StreamGuage, shift=-100, outdir=None,
+           nproc=None):
+    """
+    Process many guage files in a process pool
+
+    parameters
+    fids (list or str): guage file paths, or a glob pattern
+    guage_class (type): StreamGuage or NOAAStreamGuage
+    shift (float): time shift in minutes
+    outdir (str): directory for figures, None to skip plotting
+    nproc (int): number of worker processes, defaults to the core count
+
+    returns
+    dict: station_id -> list of processed guages, in file order
+    """
+    if isinstance(fids, str):
+        fids = sorted(glob.glob(fids))
+    if outdir is not None:
+        os.makedirs(outdir, exist_ok=True)
+    nproc = nproc or os.cpu_count()
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=nproc,
+                             initializer=_init_headless) as executor:
+        guages = executor.map(process_guage_file, fids,
+                              [guage_class] * len(fids),
+                              [shift] * len(fids), [outdir] * len(fids))
+        for guage in guages:
+            results.setdefault(guage.station_id, []).append(guage)
+    return results
+
+
 if __name__ == "__main__":
-    start = ["2024-09-07 00:00", "2024-10-07 00:00"]
-    for i, fid in enumerate(["phelan_creek_stream_guage_2024-09-07_to_2024-09-14.txt",
-                "phelan_creek_stream_guage_2024-10-07_to_2024-10-14.txt"]): 
-       NOAAStreamGuage(fid=fid, station_id="15478040", 
-                     station_name="PHELAN CREEK", 
-                     starttime=start[i]).main()  
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Process stream guage files")
+    parser.add_argument("fids", nargs="*", help="guage files or glob patterns")
+    parser.add_argument("--noaa", action="store_true",
+                        help="treat the files as NOAA stream guages")
+    parser.add_argument("--nproc", type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument("--outdir", default=None,
+                        help="save figures here instead of showing them")
+    args = parser.parse_args()
+
+    if not args.fids:
+        start = ["2024-09-07 00:00", "2024-10-07 00:00"]
+        for i, fid in enumerate(["phelan_creek_stream_guage_2024-09-07_to_2024-09-14.txt",
+                    "phelan_creek_stream_guage_2024-10-07_to_2024-10-14.txt"]): 
+           NOAAStreamGuage(fid=fid, station_id="15478040", 
+                         station_name="PHELAN CREEK", 
+                         starttime=start[i]).main()  
+    else:
+        fids = []
+        for pattern in args.fids:
+            fids.extend(sorted(glob.glob(pattern)) or [pattern])
+        guage_class = NOAAStreamGuage if args.noaa else StreamGuage
+        results = ingest(fids, guage_class, outdir=args.outdir,
+                         nproc=args.nproc)
+        for station_id, guages in results.items():
+            for guage in guages:
+                print("{} {}: {} samples, {} to {} min, max {:.3f} {}".format(
+                    station_id, guage.station_name, len(guage.data),
+                    guage.time.min(), guage.time.max(), guage.data.max(),
+                    guage.units))
+        if args.outdir is None:
+            for guages in results.values():
+                for guage in guages:
+                    guage.plot()
@@ -1,39 +1,34 @@
+import sys
 import time
 
 import numpy as np
 import matplotlib.pyplot as plt
 
-STEP = 0.0011
+from gaussian import (STEP, gaussian_grid, gaussian_grid_to_file, grid_axes,
+                      plot)
 
-def gaussian_2d(x, y, sigma):
-    """Calculate 2D Gaussian value at (x, y)."""
-    return (1 / (2 * np.pi * sigma**2)) * np.exp(
-        -1 * (x**2 + y**2) / (2 * sigma**2)
-    )
-
-def plot(z):
-    """Plot 2D Gaussian data."""
-    plt.imshow(z.T)
-    plt.gca().invert_yaxis()
-    plt.xlabel("X")
-    plt.ylabel("Y")
-    plt.title(f"{z.shape} points")
-    plt.gca().set_aspect(1)
-
-def main(xmin, xmax, ymin, ymax, sigma=1):
-    """Generate and plot 2D Gaussian."""
-    x = np.arange(float(xmin), float(xmax), STEP)
-    y = np.arange(float(ymin), float(ymax), STEP)
-    z = []
-    for x_val in x:
-        for y_val in y:
-            z.append(gaussian_2d(x_val, y_val, sigma))
-    zz = np.array(z).reshape(len(x), len(y))
+def main(xmin, xmax, ymin, ymax, sigma=1, dtype=np.float64, out=None,
+         step=STEP, outfile=None, block_bytes=64 * 2**20):
+    """
+    Generate and plot 2D Gaussian. With outfile the grid is generated in
+    row blocks of block_bytes into a memory mapped .npy file instead of
+    memory.
+    """
+    x, y = grid_axes(xmin, xmax, ymin, ymax, step)
+    if outfile is None:
+        zz = gaussian_grid(x, y, sigma, dtype=dtype, out=out)
+    else:
+        zz = gaussian_grid_to_file(x, y, outfile, sigma, dtype=dtype,
+                                   block_bytes=block_bytes)
     plot(zz)
+    return zz
 
 if __name__ == "__main__":
+    # usage: 2d_gaussian.py [step] [outfile.npy]
+    step = float(sys.argv[1]) if len(sys.argv) > 1 else STEP
+    outfile = sys.argv[2] if len(sys.argv) > 2 else None
     start = time.time()
-    main(-2, 2, -2, 2)
+    main(-2, 2, -2, 2, step=step, outfile=outfile)
     elapsed = time.time() - start
     print(f"Elapsed Time: {elapsed}s")
     plt.show()
\ No newline at end of file
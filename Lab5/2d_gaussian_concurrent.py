@@ -1,51 +1,39 @@
 
+import sys
 import time
 
 import numpy as np
 import matplotlib.pyplot as plt
-from concurrent.futures import ProcessPoolExecutor
 
-STEP = 0.0011
-nproc = 4
+from gaussian import (STEP, available_cores, gaussian_grid, grid_axes, plot,
+                      tiled_gaussian_grid)
+
+nproc = available_cores()
+tile = 256
 
 xmin = -2
 xmax = 2
 ymin = -2
 ymax = 2
 
-def gaussian_2d(x, y, sigma):
-    """Calculate 2D Gaussian value at (x, y)."""
-    return (1 / (2 * np.pi * sigma**2)) * np.exp(
-        -1 * (x**2 + y**2) / (2 * sigma**2)
-    )
-
-def plot(z):
-    """Plot 2D Gaussian data."""
-    plt.imshow(z.T)
-    plt.gca().invert_yaxis()
-    plt.xlabel("X")
-    plt.ylabel("Y")
-    plt.title(f"{z.shape} points")
-    plt.gca().set_aspect(1)
-
-def main(xmin, xmax, ymin, ymax, sigma=1):
+def main(xmin, xmax, ymin, ymax, sigma=1, dtype=np.float64, out=None):
     """Generate and plot 2D Gaussian."""
-    x = np.arange(float(xmin), float(xmax), STEP)
-    y = np.arange(float(ymin), float(ymax), STEP)
-    z = []
-    for x_val in x:
-        for y_val in y:
-            z.append(gaussian_2d(x_val, y_val, sigma))
-    zz = np.array(z).reshape(len(x), len(y))
+    x, y = grid_axes(xmin, xmax, ymin, ymax, STEP)
+    zz = gaussian_grid(x, y, sigma, dtype=dtype, out=out)
     return zz
 
+def concurrent_main(xmin, xmax, ymin, ymax, sigma=1, dtype=np.float64,
+                    nproc=nproc, tile=tile):
+    """Generate 2D Gaussian with a shared memory tiled process pool."""
+    x, y = grid_axes(xmin, xmax, ymin, ymax, STEP)
+    return tiled_gaussian_grid(x, y, sigma, dtype=dtype, nproc=nproc,
+                               tile=tile)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        nproc = int(sys.argv[1])
     start = time.time()
-    with ProcessPoolExecutor(max_workers=nproc) as executor:
-        step = (xmax - xmin) / nproc
-        futures = [executor.submit(main, xmin+step*i, xmin+step*(i+1), ymin, ymax) 
-                  for i in range(nproc)]
-        results = np.vstack([f.result() for f in futures])
+    results = concurrent_main(xmin, xmax, ymin, ymax, nproc=nproc)
 
     plot(results)
     elapsed = time.time() - start
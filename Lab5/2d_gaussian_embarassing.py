@@ -3,37 +3,37 @@ import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
-STEP = 0.0011
+from gaussian import STEP, gaussian_grid, grid_axes, plot
 
-def gaussian_2d(x, y, sigma):
-    """Calculate 2D Gaussian value at (x, y)."""
-    return (1 / (2 * np.pi * sigma**2)) * np.exp(
-        -1 * (x**2 + y**2) / (2 * sigma**2)
-    )
+def compute(xmin, xmax, ymin, ymax, sigma=1, dtype=np.float64, out=None,
+            step=STEP, rows=None):
+    """
+    Generate 2D Gaussian on one tile of the domain, or with rows=(i0, i1)
+    on x indices i0 to i1 of it only.
+    """
+    x, y = grid_axes(xmin, xmax, ymin, ymax, step)
+    if rows is not None:
+        x = x[rows[0]:rows[1]]
+    return gaussian_grid(x, y, sigma, dtype=dtype, out=out)
 
-def plot(z):
-    """Plot 2D Gaussian data."""
-    plt.imshow(z.T)
-    plt.gca().invert_yaxis()
-    plt.xlabel("X")
-    plt.ylabel("Y")
-    plt.title(f"{z.shape} points")
-    plt.gca().set_aspect(1)
-
-def main(xmin, xmax, ymin, ymax, sigma=1):
+def main(xmin, xmax, ymin, ymax, sigma=1, dtype=np.float64, out=None):
     """Generate and plot 2D Gaussian."""
-    x = np.arange(float(xmin), float(xmax), STEP)
-    y = np.arange(float(ymin), float(ymax), STEP)
-    z = []
-    for x_val in x:
-        for y_val in y:
-            z.append(gaussian_2d(x_val, y_val, sigma))
-    zz = np.array(z).reshape(len(x), len(y))
+    zz = compute(xmin, xmax, ymin, ymax, sigma, dtype=dtype, out=out)
     plot(zz)
 
 if __name__ == "__main__":
+    # usage: 2d_gaussian_embarassing.py xmin xmax ymin ymax [step [i0 i1]]
+    # with i0 i1 only that strip of x indices is computed, as one part of
+    # a larger job, and it is not plotted
+    step = float(sys.argv[5]) if len(sys.argv) > 5 else STEP
+    rows = [int(i) for i in sys.argv[6:8]] if len(sys.argv) > 7 else None
     start = time.time()
-    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    zz = compute(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4],
+                 step=step, rows=rows)
+    print(f"Compute Time: {time.time() - start}s")
+    if rows is not None:
+        sys.exit()
+    plot(zz)
     elapsed = time.time() - start
     print(f"Elapsed Time: {elapsed}s")
-    plt.show()
\ No newline at end of file
+    plt.show()
@@ -0,0 +1,38 @@
+import sys
+
+from mpi4py import MPI
+import numpy as np
+import matplotlib.pyplot as plt
+
+from gaussian import STEP, grid_axes, mpi_gaussian_grid_to_file, plot
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+
+xmin = -2
+xmax = 2
+ymin = -2
+ymax = 2
+
+def mpi_main(xmin, xmax, ymin, ymax, outfile, sigma=1, dtype=np.float64,
+             step=STEP):
+    """
+    Generate 2D Gaussian over all MPI ranks into outfile. Each rank
+    computes its own 2-D block and writes it with MPI-IO.
+    """
+    x, y = grid_axes(xmin, xmax, ymin, ymax, step)
+    return mpi_gaussian_grid_to_file(x, y, outfile, sigma, dtype=dtype,
+                                     comm=comm)
+
+if __name__ == "__main__":
+    # usage: mpiexec -n 4 python 2d_gaussian_mpi.py [step] [outfile.npy]
+    step = float(sys.argv[1]) if len(sys.argv) > 1 else STEP
+    outfile = sys.argv[2] if len(sys.argv) > 2 else "gaussian.npy"
+    comm.Barrier()
+    start = MPI.Wtime()
+    mpi_main(xmin, xmax, ymin, ymax, outfile, step=step)
+    elapsed = comm.reduce(MPI.Wtime() - start, op=MPI.MAX, root=0)
+    if rank == 0:
+        print(f"Compute Time: {elapsed}s on {comm.Get_size()} ranks")
+        plot(np.load(outfile, mmap_mode="r"))
+        plt.show()
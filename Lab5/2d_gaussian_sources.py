@@ -0,0 +1,66 @@
+
+import sys
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from gaussian import (STEP, available_cores, gaussian_grid, gaussian_sources,
+                      grid_axes, plot)
+
+nsources = 5000
+nproc = available_cores()
+
+xmin = -2
+xmax = 2
+ymin = -2
+ymax = 2
+
+def random_sources(nsources, seed=0):
+    """Centres, amplitudes and sigmas of a random source density map."""
+    rng = np.random.default_rng(seed)
+    x0 = rng.uniform(xmin, xmax, nsources)
+    y0 = rng.uniform(ymin, ymax, nsources)
+    amplitude = rng.uniform(0.5, 2, nsources)
+    sigma = rng.lognormal(np.log(0.02), 0.5, nsources)
+    return x0, y0, amplitude, sigma
+
+def naive_sources(x, y, x0, y0, amplitude, sigma):
+    """Every source evaluated over the whole grid."""
+    zz = np.zeros((len(x), len(y)))
+    for xs, ys, a, s in zip(x0, y0, amplitude, sigma):
+        zz += a * gaussian_grid(x - xs, y - ys, s)
+    return zz
+
+def sources_main(xmin, xmax, ymin, ymax, nsources, nproc=1, k=5):
+    """Generate a density map of nsources random 2D Gaussians."""
+    x, y = grid_axes(xmin, xmax, ymin, ymax, STEP)
+    return gaussian_sources(x, y, *random_sources(nsources), k=k,
+                            nproc=nproc)
+
+if __name__ == "__main__":
+    # usage: 2d_gaussian_sources.py [nsources] [nproc]
+    if len(sys.argv) > 1:
+        nsources = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        nproc = int(sys.argv[2])
+
+    # the naive sum is timed on a few sources and scaled up
+    x, y = grid_axes(xmin, xmax, ymin, ymax, STEP)
+    sources = random_sources(nsources)
+    few = [a[:20] for a in sources]
+    start = time.time()
+    naive = naive_sources(x, y, *few)
+    naive_time = (time.time() - start) * nsources / 20
+    error = np.abs(gaussian_sources(x, y, *few) - naive).max() / naive.max()
+    print(f"Naive Time: {naive_time:.1f}s (extrapolated from 20 sources), "
+          f"truncated relative error {error:.1e}")
+
+    for n in sorted({1, nproc}):
+        start = time.time()
+        results = sources_main(xmin, xmax, ymin, ymax, nsources, nproc=n)
+        print(f"Compute Time: {time.time() - start:.2f}s for {nsources} "
+              f"sources, nproc {n}")
+
+    plot(results)
+    plt.show()
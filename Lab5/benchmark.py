@@ -0,0 +1,283 @@
+import argparse
+import csv
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from gaussian import (available_cores, gaussian_2d, gaussian_grid, plot,
+                      tiled_gaussian_grid)
+
+"""
+Scaling benchmark for the Lab5 2D Gaussian variants. Every variant is run
+on the [-2, 2]² domain over a sweep of grid sizes (points per axis) and
+worker counts, repeated for statistics. Only grid generation is timed,
+plotting is timed separately. Variants are compared on wall time, which for
+embarassing includes starting its processes, the compute time they report
+is kept as the compute_mean column. Results are written as CSV and JSON
+together with time vs nproc and scaling efficiency plots.
+
+    python benchmark.py --sizes 1000 2000 4000 --nprocs 1 2 4 --repeat 3
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EMBARASSING = os.path.join(HERE, "2d_gaussian_embarassing.py")
+
+XMIN, XMAX = -2.0, 2.0
+
+
+def grid(n):
+    """x and y axes with n points each over the benchmark domain."""
+    x = np.linspace(XMIN, XMAX, n, endpoint=False)
+    return x, x.copy()
+
+
+def run_serial(n, nproc):
+    """The original double loop over grid points, one process."""
+    x, y = grid(n)
+    z = []
+    for x_val in x:
+        for y_val in y:
+            z.append(gaussian_2d(x_val, y_val, 1))
+    return np.array(z).reshape(len(x), len(y))
+
+
+def run_vectorized(n, nproc):
+    """Separable vectorized evaluation, one process."""
+    x, y = grid(n)
+    return gaussian_grid(x, y)
+
+
+def run_pool(n, nproc):
+    """Shared memory tiled process pool."""
+    x, y = grid(n)
+    return tiled_gaussian_grid(x, y, nproc=nproc)
+
+
+def run_embarassing(n, nproc):
+    """
+    Launch nproc independent 2d_gaussian_embarassing.py processes, one x
+    strip each, and wait for all of them. Strips are index ranges of the
+    n x n grid, as in embarassing_driver, so together they cover exactly
+    the points of the other variants. Returns the slowest reported compute
+    time, the wall time also includes interpreter start up.
+    """
+    step = (XMAX - XMIN) / n
+    # half a step short of XMAX, so np.arange gives n points despite roundoff
+    stop = XMIN + (n - 0.5) * step
+    bounds = np.linspace(0, n, nproc + 1).astype(int)
+    env = dict(os.environ, MPLBACKEND="Agg")
+    procs = [subprocess.Popen([sys.executable, EMBARASSING, str(XMIN),
+                               str(stop), str(XMIN), str(stop), str(step),
+                               str(i0), str(i1)],
+                              stdout=subprocess.PIPE, text=True, env=env)
+             for i0, i1 in zip(bounds[:-1], bounds[1:])]
+    compute = 0.0
+    for proc in procs:
+        out, _ = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"{EMBARASSING} failed:\n{out}")
+        match = re.search(r"Compute Time: ([0-9.eE+-]+)s", out)
+        compute = max(compute, float(match.group(1)))
+    return compute
+
+
+VARIANTS = {
+    "serial": run_serial,
+    "vectorized": run_vectorized,
+    "pool": run_pool,
+    "embarassing": run_embarassing,
+}
+
+# Variants that do not use more than one process
+SINGLE = {"serial", "vectorized"}
+
+
+def time_variant(name, n, nproc, repeat):
+    """Wall (and for embarassing, reported compute) times of repeated runs."""
+    wall, compute = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = VARIANTS[name](n, nproc)
+        wall.append(time.perf_counter() - start)
+        compute.append(result if name == "embarassing" else wall[-1])
+        del result
+    return np.array(wall), np.array(compute)
+
+
+def time_plot(n, repeat):
+    """Time to plot and render an n x n grid."""
+    z = run_vectorized(n, 1)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plt.figure()
+        plot(z)
+        plt.gcf().canvas.draw()
+        plt.close()
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def sweep(variants, sizes, nprocs, repeat, max_serial_n):
+    """Run every variant over sizes and nprocs, return a list of records."""
+    records = []
+    for n in sizes:
+        for name in variants:
+            if name == "serial" and n > max_serial_n:
+                continue
+            for nproc in ([1] if name in SINGLE else nprocs):
+                wall, compute = time_variant(name, n, nproc, repeat)
+                records.append({
+                    "variant": name, "n": n, "points": n * n,
+                    "nproc": nproc, "repeat": repeat,
+                    "mean": wall.mean(), "std": wall.std(),
+                    "min": wall.min(), "compute_mean": compute.mean(),
+                })
+                print("{variant:>12} n={n:<6} nproc={nproc:<3} "
+                      "{mean:.4f} +- {std:.4f}s".format(**records[-1]))
+        plot_times = time_plot(n, repeat)
+        records.append({
+            "variant": "plot", "n": n, "points": n * n, "nproc": 1,
+            "repeat": repeat, "mean": plot_times.mean(),
+            "std": plot_times.std(), "min": plot_times.min(),
+            "compute_mean": plot_times.mean(),
+        })
+        print("{variant:>12} n={n:<6} nproc={nproc:<3} "
+              "{mean:.4f} +- {std:.4f}s".format(**records[-1]))
+    return records
+
+
+def strong_scaling(records):
+    """Strong scaling efficiency T(1) / (p * T(p)) for a fixed grid size."""
+    base = {(r["variant"], r["n"]): r["mean"] for r in records
+            if r["nproc"] == 1}
+    for r in records:
+        t1 = base.get((r["variant"], r["n"]))
+        r["speedup"] = t1 / r["mean"] if t1 else np.nan
+        r["strong_efficiency"] = r["speedup"] / r["nproc"]
+    return records
+
+
+def weak_scaling(variants, base_n, nprocs, repeat):
+    """
+    Weak scaling efficiency T(1) / T(p) when each worker keeps
+    base_n² points, i.e. the grid has sqrt(p) * base_n points per axis.
+    """
+    records = []
+    for name in variants:
+        if name in SINGLE:
+            continue
+        t1 = None
+        for nproc in nprocs:
+            n = int(round(base_n * np.sqrt(nproc)))
+            wall, compute = time_variant(name, n, nproc, repeat)
+            t1 = t1 or (wall.mean() if nproc == 1 else None)
+            records.append({
+                "variant": name, "n": n, "points": n * n, "nproc": nproc,
+                "repeat": repeat, "mean": wall.mean(), "std": wall.std(),
+                "compute_mean": compute.mean(),
+                "weak_efficiency": t1 / wall.mean() if t1 else np.nan,
+            })
+            print("{variant:>12} weak n={n:<6} nproc={nproc:<3} "
+                  "{mean:.4f}s efficiency {weak_efficiency:.2f}".format(
+                      **records[-1]))
+    return records
+
+
+def write_results(records, weak, outdir):
+    """Write strong and weak scaling records as CSV and JSON."""
+    os.makedirs(outdir, exist_ok=True)
+    for name, rows in [("strong", records), ("weak", weak)]:
+        if not rows:
+            continue
+        fields = list(dict.fromkeys(k for r in rows for k in r))
+        with open(os.path.join(outdir, f"{name}_scaling.csv"), "w",
+                  newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    with open(os.path.join(outdir, "benchmark.json"), "w") as f:
+        json.dump({"cores": available_cores(), "strong": records,
+                   "weak": weak}, f, indent=2, default=float)
+
+
+def plot_results(records, weak, outdir):
+    """Time vs nproc per grid size, and strong/weak scaling efficiency."""
+    fig, axs = plt.subplots(1, 2, figsize=(11, 4.5))
+    markers = dict(zip(VARIANTS, "osd^"))
+    sizes = sorted({r["n"] for r in records})
+    cm = plt.cm.viridis(np.linspace(0, 0.9, len(sizes)))
+    for color, n in zip(cm, sizes):
+        for name in VARIANTS:
+            rows = [r for r in records if r["variant"] == name
+                    and r["n"] == n]
+            if not rows:
+                continue
+            p = [r["nproc"] for r in rows]
+            t = [r["mean"] for r in rows]
+            err = [r["std"] for r in rows]
+            axs[0].errorbar(p, t, yerr=err, marker=markers[name], color=color,
+                            ls="-" if len(p) > 1 else "none",
+                            label=f"{name} n={n}")
+            if len(p) > 1:
+                axs[1].plot(p, [r["strong_efficiency"] for r in rows],
+                            marker=markers[name], color=color,
+                            label=f"{name} strong n={n}")
+    for name in VARIANTS:
+        rows = [r for r in weak if r["variant"] == name]
+        if rows:
+            axs[1].plot([r["nproc"] for r in rows],
+                        [r["weak_efficiency"] for r in rows], "k--",
+                        marker=markers[name], label=f"{name} weak")
+
+    axs[0].set_xscale("log", base=2)
+    axs[0].set_yscale("log")
+    axs[0].set_xlabel("nproc")
+    axs[0].set_ylabel("Wall time (s)")
+    axs[0].set_title("Time vs nproc")
+    axs[1].set_xscale("log", base=2)
+    axs[1].axhline(1, c="gray", lw=0.5)
+    axs[1].set_xlabel("nproc")
+    axs[1].set_ylabel("Efficiency")
+    axs[1].set_title("Scaling efficiency")
+    for ax in axs:
+        ax.legend(fontsize=6)
+    plt.tight_layout()
+    plt.savefig(os.path.join(outdir, "time_vs_nproc.png"), dpi=150)
+    plt.close()
+
+
+if __name__ == "__main__":
+    cores = available_cores()
+    parser = argparse.ArgumentParser(
+        description="Scaling benchmark for the Lab5 2D Gaussian variants")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS),
+                        choices=list(VARIANTS))
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        default=[500, 1000, 2000, 3637],
+                        help="grid points per axis")
+    parser.add_argument("--nprocs", nargs="+", type=int,
+                        default=sorted({2**i for i in range(8)
+                                        if 2**i <= cores} | {cores}))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-serial-n", type=int, default=1000,
+                        help="largest grid for the Python loop variant")
+    parser.add_argument("--weak-n", type=int, default=1000,
+                        help="points per axis per worker for weak scaling")
+    parser.add_argument("--outdir", default="benchmark_results")
+    args = parser.parse_args()
+
+    records = strong_scaling(sweep(args.variants, args.sizes, args.nprocs,
+                                   args.repeat, args.max_serial_n))
+    weak = weak_scaling(args.variants, args.weak_n, args.nprocs, args.repeat)
+    write_results(records, weak, args.outdir)
+    plot_results(records, weak, args.outdir)
+    print(f"Results written to {args.outdir}")
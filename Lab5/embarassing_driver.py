@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from gaussian import STEP, available_cores, gaussian_grid, grid_axes
+
+"""
+Driver for the embarrassingly parallel 2D Gaussian. The domain is cut into
+tiles, every tile is computed by an independent process that saves it to
+its own .npy file, and the tiles are then memory mapped back into one
+output grid. There is no communication between the workers, so they can
+run as local subprocesses or as a SLURM array job on many nodes.
+
+    python embarassing_driver.py run --ntiles 4 4 --output gaussian.npy
+    python embarassing_driver.py slurm --ntiles 8 8 --submit
+    python embarassing_driver.py assemble tiles/manifest.json
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SLURM_TEMPLATE = """#!/bin/bash
+#SBATCH --job-name="gaussian tiles"
+#SBATCH --partition={partition}
+#SBATCH --ntasks=1
+#SBATCH --array=0-{last}%{max_running}
+#SBATCH --output={workdir}/%A_%a.out
+#SBATCH --time={time}
+
+srun {python} {driver} worker {manifest} $SLURM_ARRAY_TASK_ID
+"""
+
+
+def partition(nx, ny, ntx, nty):
+    """(i0, i1, j0, j1) index bounds of an ntx by nty split of the grid."""
+    xb = np.linspace(0, nx, ntx + 1).astype(int)
+    yb = np.linspace(0, ny, nty + 1).astype(int)
+    return [(int(xb[i]), int(xb[i + 1]), int(yb[j]), int(yb[j + 1]))
+            for i in range(ntx) for j in range(nty)]
+
+
+def write_manifest(workdir, xmin, xmax, ymin, ymax, ntiles, step=STEP,
+                   sigma=1, dtype="float64"):
+    """
+    Partition the domain and describe the job in workdir/manifest.json.
+    Tiles are index ranges into the full grid axes, so every worker
+    evaluates exactly the points of the serial grid.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    x, y = grid_axes(xmin, xmax, ymin, ymax, step)
+    manifest = {
+        "xmin": xmin, "xmax": xmax, "ymin": ymin, "ymax": ymax,
+        "step": step, "sigma": sigma, "dtype": dtype,
+        "shape": [len(x), len(y)],
+        "workdir": os.path.abspath(workdir),
+        "tiles": partition(len(x), len(y), *ntiles),
+    }
+    path = os.path.join(workdir, "manifest.json")
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    return path
+
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def tile_path(manifest, index):
+    return os.path.join(manifest["workdir"], f"tile_{index:05d}.npy")
+
+
+def worker(manifest_path, index):
+    """Compute one tile and save it to its .npy file."""
+    manifest = load_manifest(manifest_path)
+    i0, i1, j0, j1 = manifest["tiles"][index]
+    x, y = grid_axes(manifest["xmin"], manifest["xmax"], manifest["ymin"],
+                     manifest["ymax"], manifest["step"])
+    zz = gaussian_grid(x[i0:i1], y[j0:j1], manifest["sigma"],
+                       dtype=manifest["dtype"])
+    # write then rename so a partial tile is never picked up
+    path = tile_path(manifest, index)
+    tmp = path + ".tmp.npy"
+    np.save(tmp, zz)
+    os.replace(tmp, path)
+
+
+def launch_local(manifest_path, nproc=None):
+    """
+    Run every tile as an independent subprocess, nproc at a time. If a tile
+    fails (or we are interrupted) the tiles still running are stopped.
+    """
+    manifest = load_manifest(manifest_path)
+    nproc = nproc or available_cores()
+    pending = list(range(len(manifest["tiles"])))
+    running = []
+    try:
+        while pending or running:
+            while pending and len(running) < nproc:
+                index = pending.pop(0)
+                running.append((index, subprocess.Popen(
+                    [sys.executable,
+                     os.path.join(HERE, "embarassing_driver.py"),
+                     "worker", manifest_path, str(index)])))
+            time.sleep(0.01)
+            for index, proc in list(running):
+                if proc.poll() is not None:
+                    running.remove((index, proc))
+                    if proc.returncode != 0:
+                        raise RuntimeError(f"tile {index} failed with exit "
+                                           f"code {proc.returncode}")
+    finally:
+        for _, proc in running:
+            proc.terminate()
+        for _, proc in running:
+            proc.wait()
+
+
+def write_slurm(manifest_path, partition="debug", max_running=24,
+                walltime="00:10:00"):
+    """Write an array job script with one task per tile."""
+    manifest = load_manifest(manifest_path)
+    script = SLURM_TEMPLATE.format(
+        partition=partition, last=len(manifest["tiles"]) - 1,
+        max_running=max_running, workdir=manifest["workdir"], time=walltime,
+        python=sys.executable,
+        driver=os.path.join(HERE, "embarassing_driver.py"),
+        manifest=os.path.abspath(manifest_path))
+    path = os.path.join(manifest["workdir"], "tiles.sh")
+    with open(path, "w") as f:
+        f.write(script)
+    return path
+
+
+def assemble(manifest_path, output):
+    """
+    Copy every tile into one .npy grid. Both the tiles and the output are
+    memory mapped, so only one tile is in memory at a time.
+    """
+    manifest = load_manifest(manifest_path)
+    zz = np.lib.format.open_memmap(output, mode="w+",
+                                   dtype=manifest["dtype"],
+                                   shape=tuple(manifest["shape"]))
+    for index, (i0, i1, j0, j1) in enumerate(manifest["tiles"]):
+        path = tile_path(manifest, index)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"tile {index} missing: {path}")
+        zz[i0:i1, j0:j1] = np.load(path, mmap_mode="r")
+    zz.flush()
+    return zz
+
+
+def remove_tiles(manifest_path):
+    """
+    Delete the tiles, any partly written tiles and the manifest, then the
+    workdir if nothing else is in it. Other files are left alone.
+    """
+    manifest = load_manifest(manifest_path)
+    for index in range(len(manifest["tiles"])):
+        path = tile_path(manifest, index)
+        for name in [path, path + ".tmp.npy"]:
+            if os.path.exists(name):
+                os.remove(name)
+    os.remove(manifest_path)
+    if not os.listdir(manifest["workdir"]):
+        os.rmdir(manifest["workdir"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Tile, run and reassemble the 2D Gaussian")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    domain = argparse.ArgumentParser(add_help=False)
+    domain.add_argument("--domain", nargs=4, type=float,
+                        default=[-2, 2, -2, 2],
+                        metavar=("XMIN", "XMAX", "YMIN", "YMAX"))
+    domain.add_argument("--step", type=float, default=STEP)
+    domain.add_argument("--ntiles", nargs=2, type=int, default=[4, 4],
+                        metavar=("NX", "NY"))
+    domain.add_argument("--dtype", default="float64")
+    domain.add_argument("--workdir", default="tiles")
+
+    run = sub.add_parser("run", parents=[domain],
+                         help="run the tiles locally and assemble them")
+    run.add_argument("--nproc", type=int, default=None)
+    run.add_argument("--output", default="gaussian.npy")
+    run.add_argument("--keep-tiles", action="store_true")
+
+    slurm = sub.add_parser("slurm", parents=[domain],
+                           help="write (and submit) a SLURM array job")
+    slurm.add_argument("--partition", default="debug")
+    slurm.add_argument("--max-running", type=int, default=24)
+    slurm.add_argument("--time", default="00:10:00")
+    slurm.add_argument("--submit", action="store_true")
+
+    work = sub.add_parser("worker", help="compute one tile")
+    work.add_argument("manifest")
+    work.add_argument("index", type=int)
+
+    asm = sub.add_parser("assemble", help="assemble finished tiles")
+    asm.add_argument("manifest")
+    asm.add_argument("--output", default="gaussian.npy")
+
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        worker(args.manifest, args.index)
+
+    elif args.command == "assemble":
+        zz = assemble(args.manifest, args.output)
+        print(f"Assembled {zz.shape} grid into {args.output}")
+
+    else:
+        manifest = write_manifest(args.workdir, *args.domain, args.ntiles,
+                                  step=args.step, dtype=args.dtype)
+        if args.command == "slurm":
+            script = write_slurm(manifest, args.partition, args.max_running,
+                                 args.time)
+            if args.submit:
+                subprocess.run(["sbatch", script], check=True)
+            print(f"Array job script {script}, when it has finished run:\n"
+                  f"  python {sys.argv[0]} assemble {manifest}")
+        else:
+            start = time.time()
+            launch_local(manifest, args.nproc)
+            compute = time.time() - start
+            zz = assemble(manifest, args.output)
+            if not args.keep_tiles:
+                remove_tiles(manifest)
+            print(f"Compute Time: {compute}s")
+            print(f"Assembled {zz.shape} grid into {args.output}, "
+                  f"Elapsed Time: {time.time() - start}s")
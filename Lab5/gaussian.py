@@ -0,0 +1,318 @@
+import io
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+STEP = 0.0011
+
+def gaussian_2d(x, y, sigma):
+    """Calculate 2D Gaussian value at (x, y)."""
+    return (1 / (2 * np.pi * sigma**2)) * np.exp(
+        -1 * (x**2 + y**2) / (2 * sigma**2)
+    )
+
+def grid_axes(xmin, xmax, ymin, ymax, step=STEP):
+    """x and y grid coordinates, the same points the original loops used."""
+    x = np.arange(float(xmin), float(xmax), step)
+    y = np.arange(float(ymin), float(ymax), step)
+    return x, y
+
+def gaussian_grid(x, y, sigma=1, dtype=np.float64, out=None, separable=True):
+    """
+    Evaluate the 2D Gaussian on the grid x (rows) by y (columns).
+
+    The Gaussian is separable, exp(-(x²+y²)) = exp(-x²)·exp(-y²), so by
+    default only len(x) + len(y) exponentials are evaluated and the grid
+    is their outer product. separable=False broadcasts x² + y² and takes
+    one exponential per grid point instead.
+
+    dtype sets the output precision (e.g. np.float32), out is an optional
+    preallocated (len(x), len(y)) array to write into.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if out is None:
+        out = np.empty((len(x), len(y)), dtype=dtype)
+    if separable:
+        norm = 1 / (2 * np.pi * sigma**2)
+        gx = norm * np.exp(-1 * x**2 / (2 * sigma**2))
+        gy = np.exp(-1 * y**2 / (2 * sigma**2))
+        np.multiply.outer(gx.astype(out.dtype), gy.astype(out.dtype), out=out)
+    else:
+        out[...] = gaussian_2d(x[:, None], y[None, :], sigma)
+    return out
+
+def available_cores():
+    """Number of cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count()
+
+def grid_tiles(nx, ny, tile=256):
+    """(i0, i1, j0, j1) bounds of the 2-D tiles covering an nx by ny grid."""
+    return [(i, min(i + tile, nx), j, min(j + tile, ny))
+            for i in range(0, nx, tile) for j in range(0, ny, tile)]
+
+# Worker state, set once per process by _attach_grid
+_worker = {}
+
+def _attach_grid(name, shape, dtype, x, y, sigma):
+    """Map the shared output array into a worker process."""
+    shm = shared_memory.SharedMemory(name=name)
+    _worker["shm"] = shm
+    _worker["out"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["x"], _worker["y"], _worker["sigma"] = x, y, sigma
+
+def _fill_tile(bounds):
+    """Evaluate one tile straight into the shared output array."""
+    i0, i1, j0, j1 = bounds
+    gaussian_grid(_worker["x"][i0:i1], _worker["y"][j0:j1], _worker["sigma"],
+                  out=_worker["out"][i0:i1, j0:j1])
+
+def tiled_gaussian_grid(x, y, sigma=1, dtype=np.float64, nproc=None,
+                        tile=256):
+    """
+    Evaluate the 2D Gaussian on the grid x by y with a pool of processes.
+
+    Workers pull 2-D tiles of tile x tile points from the pool's work queue
+    and write them directly into one shared memory array, so nothing is
+    pickled back or stacked. Every tile is cut from the same x and y axes,
+    so the result is bit-identical to gaussian_grid(x, y, sigma, dtype).
+    nproc defaults to the number of available cores.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    shape = (len(x), len(y))
+    dtype = np.dtype(dtype)
+    nproc = nproc or available_cores()
+
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    zz = None
+    try:
+        with ProcessPoolExecutor(max_workers=nproc, initializer=_attach_grid,
+                                 initargs=(shm.name, shape, dtype, x, y,
+                                           sigma)) as executor:
+            for _ in executor.map(_fill_tile, grid_tiles(*shape, tile)):
+                pass
+        zz = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        weakref.finalize(zz, shm.close)
+    finally:
+        # the mapping outlives the name, it is closed with the array or
+        # right away if a worker failed
+        shm.unlink()
+        if zz is None:
+            shm.close()
+    return zz
+
+def gaussian_grid_to_file(x, y, path, sigma=1, dtype=np.float64,
+                          block_bytes=64 * 2**20):
+    """
+    Evaluate the 2D Gaussian on the grid x by y out of core.
+
+    The grid is written in blocks of rows into a .npy file. Each block is
+    its own short lived np.memmap that is flushed and unmapped before the
+    next one, so peak memory is set by block_bytes rather than by the size
+    of the grid. Returns the finished grid memory mapped read only.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    dtype = np.dtype(dtype)
+    zz = np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                   shape=(len(x), len(y)))
+    offset = zz.offset
+    del zz
+
+    row_bytes = dtype.itemsize * len(y)
+    rows = max(1, block_bytes // max(row_bytes, 1))
+    for i in range(0, len(x), rows):
+        block = np.memmap(path, mode="r+", dtype=dtype,
+                          offset=offset + i * row_bytes,
+                          shape=(len(x[i:i + rows]), len(y)))
+        gaussian_grid(x[i:i + rows], y, sigma, out=block)
+        block.flush()
+        del block
+    return np.load(path, mmap_mode="r")
+
+def _windows(axis, centre, halfwidth):
+    """[start, stop) indices of the sorted axis within centre -/+ halfwidth."""
+    return (np.searchsorted(axis, centre - halfwidth, "left"),
+            np.searchsorted(axis, centre + halfwidth, "right"))
+
+def add_gaussian_sources(out, x, y, x0, y0, amplitude=1, sigma=1, k=5):
+    """
+    Add many 2D Gaussians into out, the (len(x), len(y)) grid x by y.
+
+    Source s is amplitude[s] * gaussian_2d(x - x0[s], y - y0[s], sigma[s])
+    and is only evaluated on its footprint, the points within k * sigma of
+    its centre, where values above exp(-k**2 / 2) of its peak lie (4e-6
+    for k=5). The footprint is the outer product of two 1-D exponentials
+    and is added into a slice of out, so the cost follows the footprints
+    rather than sources x grid points. x and y must be sorted.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x0, y0, amplitude, sigma = (a.ravel() for a in np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64)
+          for a in (x0, y0, amplitude, sigma))))
+    i0, i1 = _windows(x, x0, k * sigma)
+    j0, j1 = _windows(y, y0, k * sigma)
+    norm = amplitude / (2 * np.pi * sigma**2)
+    for s in np.flatnonzero((i1 > i0) & (j1 > j0)).tolist():
+        a, b, c, d = int(i0[s]), int(i1[s]), int(j0[s]), int(j1[s])
+        scale = -0.5 / sigma[s]**2
+        gx = norm[s] * np.exp(scale * (x[a:b] - x0[s])**2)
+        gy = np.exp(scale * (y[c:d] - y0[s])**2)
+        out[a:b, c:d] += np.multiply.outer(gx.astype(out.dtype),
+                                           gy.astype(out.dtype))
+    return out
+
+def _attach_buffers(name, shape, dtype, x, y):
+    """Map the shared per-worker accumulation buffers into a worker."""
+    shm = shared_memory.SharedMemory(name=name)
+    _worker["shm"] = shm
+    _worker["out"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["x"], _worker["y"] = x, y
+
+def _add_chunk(args):
+    """Accumulate one chunk of sources into its own buffer."""
+    index, x0, y0, amplitude, sigma, k = args
+    add_gaussian_sources(_worker["out"][index], _worker["x"], _worker["y"],
+                         x0, y0, amplitude, sigma, k)
+
+def gaussian_sources(x, y, x0, y0, amplitude=1, sigma=1, k=5,
+                     dtype=np.float64, nproc=1):
+    """
+    Sum of many 2D Gaussians on the grid x by y, see add_gaussian_sources.
+
+    With nproc > 1 the sources are split into nproc chunks of about equal
+    footprint area. Each chunk is accumulated by a pool process into its
+    own grid sized buffer in shared memory, so workers never write to the
+    same array, and the buffers are summed at the end. That needs nproc
+    grids of extra memory, and the summation order differs from the
+    serial result by roundoff.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    shape = (len(x), len(y))
+    dtype = np.dtype(dtype)
+    x0, y0, amplitude, sigma = (a.ravel() for a in np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64)
+          for a in (x0, y0, amplitude, sigma))))
+    nproc = min(nproc or available_cores(), max(len(x0), 1))
+    if nproc == 1:
+        return add_gaussian_sources(np.zeros(shape, dtype=dtype), x, y, x0,
+                                    y0, amplitude, sigma, k)
+
+    # contiguous chunks of sources with about equal footprint area
+    i0, i1 = _windows(x, x0, k * sigma)
+    j0, j1 = _windows(y, y0, k * sigma)
+    work = np.cumsum((i1 - i0) * (j1 - j0) + 1)
+    bounds = np.searchsorted(work, np.linspace(0, work[-1], nproc + 1)[1:-1])
+    chunks = [(index, x0[a:b], y0[a:b], amplitude[a:b], sigma[a:b], k)
+              for index, (a, b) in enumerate(zip([0, *bounds],
+                                                 [*bounds, len(x0)]))]
+
+    buffers_shape = (nproc,) + shape
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(int(np.prod(buffers_shape)) * dtype.itemsize,
+                              1))
+    buffers = None
+    try:
+        buffers = np.ndarray(buffers_shape, dtype=dtype, buffer=shm.buf)
+        buffers[...] = 0
+        with ProcessPoolExecutor(max_workers=nproc,
+                                 initializer=_attach_buffers,
+                                 initargs=(shm.name, buffers_shape, dtype, x,
+                                           y)) as executor:
+            for _ in executor.map(_add_chunk, chunks):
+                pass
+        zz = buffers.sum(axis=0)
+    finally:
+        # no views of the mapping may be left when it is closed
+        del buffers
+        shm.close()
+        shm.unlink()
+    return zz
+
+def npy_header(shape, dtype):
+    """Header of a C ordered .npy file, the array data follows it."""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": tuple(shape),
+    })
+    return header.getvalue()
+
+def mpi_gaussian_grid_to_file(x, y, path, sigma=1, dtype=np.float64,
+                              comm=None):
+    """
+    Evaluate the 2D Gaussian on the grid x by y over the ranks of an MPI
+    communicator (COMM_WORLD by default) straight into a .npy file.
+
+    The grid is split into one 2-D block per rank. Every rank computes
+    only its own block, and all ranks write collectively with MPI-IO
+    through a subarray file view. Nothing is gathered on one rank, so the
+    largest grid is set by the memory of all ranks together. Returns this
+    rank's (i0, i1, j0, j1) block bounds.
+    """
+    from mpi4py import MPI
+    from mpi4py.util import dtlib
+
+    comm = MPI.COMM_WORLD if comm is None else comm
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    dtype = np.dtype(dtype)
+    shape = (len(x), len(y))
+
+    # row major process grid, as MPI_Cart_create would number it
+    dims = MPI.Compute_dims(comm.Get_size(), 2)
+    ci, cj = divmod(comm.Get_rank(), dims[1])
+    i0, i1 = shape[0] * ci // dims[0], shape[0] * (ci + 1) // dims[0]
+    j0, j1 = shape[1] * cj // dims[1], shape[1] * (cj + 1) // dims[1]
+    block = gaussian_grid(x[i0:i1], y[j0:j1], sigma, dtype=dtype)
+
+    header = npy_header(shape, dtype)
+    etype = dtlib.from_numpy_dtype(dtype)
+    fh = MPI.File.Open(comm, path, MPI.MODE_CREATE | MPI.MODE_WRONLY)
+    fh.Set_size(len(header) + block.itemsize * shape[0] * shape[1])
+    if comm.Get_rank() == 0:
+        fh.Write_at(0, header)
+    filetype = etype
+    if block.size:
+        filetype = etype.Create_subarray(shape, block.shape,
+                                         (i0, j0)).Commit()
+    fh.Set_view(len(header), etype, filetype)
+    fh.Write_at_all(0, block)
+    fh.Close()
+    if filetype != etype:
+        filetype.Free()
+    return i0, i1, j0, j1
+
+def downsample(z, max_points=2000):
+    """Strided preview of z with at most max_points along each axis."""
+    stride = max(1, -(-max(z.shape) // max_points))
+    return np.asarray(z[::stride, ::stride]), stride
+
+def plot(z, max_points=2000):
+    """
+    Plot 2D Gaussian data. Grids larger than max_points along an axis are
+    shown as a strided preview, with axes still in full grid indices.
+    """
+    preview, stride = downsample(z, max_points)
+    nx, ny = z.shape
+    plt.imshow(preview.T, extent=(-0.5, nx - 0.5, ny - 0.5, -0.5))
+    plt.gca().invert_yaxis()
+    plt.xlabel("X")
+    plt.ylabel("Y")
+    if stride > 1:
+        plt.title(f"{z.shape} points (every {stride}th shown)")
+    else:
+        plt.title(f"{z.shape} points")
+    plt.gca().set_aspect(1)
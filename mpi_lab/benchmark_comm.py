@@ -0,0 +1,109 @@
+import argparse
+import csv
+import os
+
+from mpi4py import MPI
+import numpy as np
+
+from communication import irecv, isend, recv, send
+
+"""
+Latency and bandwidth of the pickled (lowercase) and buffer (uppercase)
+paths over a sweep of message sizes. Ping-pong bounces a float64 array
+between ranks 0 and 1 and reports the one way time. Ring shifts an array
+one rank to the right on every rank at once and reports the time per
+step. The "layer" path is communication.send/recv with its shape and
+dtype header.
+
+    mpiexec -n 4 python benchmark_comm.py --max-bytes 16777216
+"""
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+
+def repetitions(nbytes):
+    """More repetitions for small messages, at most 1000."""
+    return int(np.clip(2**24 // max(nbytes, 1), 10, 1000))
+
+
+def ping_pong(arr, path, nrep):
+    """One way time of arr between ranks 0 and 1."""
+    out = np.empty_like(arr)
+    comm.Barrier()
+    start = MPI.Wtime()
+    for _ in range(nrep):
+        if rank == 0:
+            if path == "pickle":
+                comm.send(arr, dest=1)
+                comm.recv(source=1)
+            elif path == "layer":
+                send(arr, dest=1)
+                recv(source=1)
+            else:
+                comm.Send(arr, dest=1)
+                comm.Recv(out, source=1)
+        elif rank == 1:
+            if path == "pickle":
+                comm.send(comm.recv(source=0), dest=0)
+            elif path == "layer":
+                send(recv(source=0), dest=0)
+            else:
+                comm.Recv(out, source=0)
+                comm.Send(out, dest=0)
+    return (MPI.Wtime() - start) / (2 * nrep)
+
+
+def ring(arr, path, nrep):
+    """Time per step of every rank sending arr to its right neighbour."""
+    right, left = (rank + 1) % size, (rank - 1) % size
+    out = np.empty_like(arr)
+    comm.Barrier()
+    start = MPI.Wtime()
+    for _ in range(nrep):
+        if path == "pickle":
+            comm.sendrecv(arr, dest=right, source=left)
+        else:
+            MPI.Request.Waitall([irecv(out, source=left, tag=0),
+                                 isend(arr, dest=right, tag=0)])
+    return comm.allreduce(MPI.Wtime() - start, op=MPI.MAX) / nrep
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pickled vs buffer MPI latency and bandwidth")
+    parser.add_argument("--min-bytes", type=int, default=8)
+    parser.add_argument("--max-bytes", type=int, default=2**24)
+    parser.add_argument("--output", default=None, help="CSV file")
+    args = parser.parse_args()
+
+    if size < 2:
+        raise SystemExit("run with at least 2 ranks, mpiexec -n 2 ...")
+
+    sizes = 2 ** np.arange(int(np.log2(args.min_bytes)),
+                           int(np.log2(args.max_bytes)) + 1, 2)
+    records = []
+    for nbytes in sizes:
+        arr = np.random.default_rng(rank).random(max(nbytes // 8, 1))
+        nrep = repetitions(arr.nbytes)
+        for bench, paths in [(ping_pong, ["pickle", "layer", "buffer"]),
+                             (ring, ["pickle", "buffer"])]:
+            for path in paths:
+                t = bench(arr, path, nrep)
+                records.append({"benchmark": bench.__name__, "path": path,
+                                "ranks": size, "bytes": arr.nbytes,
+                                "latency_us": t * 1e6,
+                                "bandwidth_MBs": arr.nbytes / t / 1e6})
+                if rank == 0:
+                    print("{benchmark:>9} {path:>6} {bytes:>10} B "
+                          "{latency_us:>10.2f} us {bandwidth_MBs:>10.1f} MB/s"
+                          .format(**records[-1]))
+
+    if rank == 0 and args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(records[0]))
+            writer.writeheader()
+            writer.writerows(records)
+        print(f"Results written to {args.output}")
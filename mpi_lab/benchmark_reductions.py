@@ -0,0 +1,60 @@
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+
+"""
+Scaling benchmark for reductions.py. reductions.py is launched with
+mpiexec once per rank count, times the scatter and every reduction over a
+sweep of N (best of 5) and the results are collected into one table.
+
+    python benchmark_reductions.py --nprocs 1 2 4 8 --sizes 1000 1000000
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REDUCTIONS = os.path.join(HERE, "reductions.py")
+
+
+def run(nproc, sizes, mpiexec="mpiexec", extra=()):
+    """Run reductions.py on nproc ranks, return one record per N."""
+    out = subprocess.run([mpiexec, *extra, "-n", str(nproc), sys.executable,
+                          REDUCTIONS, *map(str, sizes)],
+                         capture_output=True, text=True, check=True).stdout
+    records = []
+    for line in out.splitlines():
+        if line.startswith("ranks="):
+            records.append({k: float(v) if "." in v or "e" in v else int(v)
+                            for k, v in (f.split("=") for f in line.split())})
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Scaling benchmark for the distributed reductions")
+    parser.add_argument("--nprocs", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        default=[1000, 100_000, 10_000_001])
+    parser.add_argument("--mpiexec", default=shutil.which("mpiexec"))
+    parser.add_argument("--oversubscribe", action="store_true",
+                        help="allow more ranks than cores (Open MPI)")
+    parser.add_argument("--output", default="benchmark_results/reductions.csv")
+    args = parser.parse_args()
+
+    extra = ["--oversubscribe"] if args.oversubscribe else []
+    records = [r for nproc in args.nprocs
+               for r in run(nproc, args.sizes, args.mpiexec, extra)]
+
+    fields = list(records[0])
+    print(" ".join(f"{f:>10}" for f in fields))
+    for r in records:
+        print(" ".join(f"{r[f]:>10.3e}" if isinstance(r[f], float)
+                       else f"{r[f]:>10}" for f in fields))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(records)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,181 @@
+from mpi4py import MPI
+import numpy as np
+
+"""
+Communication layer for the mpi_lab scripts. Numeric NumPy arrays and
+numbers go through the buffer based (uppercase) calls, which hand MPI the
+raw memory without pickling, anything else falls back to the pickle based
+(lowercase) calls. A receiver that does not know the shape and dtype of
+an array gets them in a small header message first; with header=False
+the caller supplies a buffer of the right shape and dtype on every rank
+and only the data is sent.
+"""
+
+comm = MPI.COMM_WORLD
+
+
+def is_buffer(obj):
+    """
+    Whether obj is sent with the buffer based calls: numbers and arrays of
+    bool, integer, float or complex dtype. Object and string arrays and
+    ints that do not fit in int64 are pickled.
+    """
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.dtype.kind in "biufc"
+    if isinstance(obj, int):
+        return -2**63 <= obj < 2**63
+    return isinstance(obj, (float, complex))
+
+
+def _as_buffer(obj):
+    """obj as a C contiguous array, 0-d for scalars."""
+    arr = np.asarray(obj)
+    return arr if arr.flags.c_contiguous else arr.copy()
+
+
+def _unwrap(arr):
+    """Scalars back from 0-d arrays."""
+    return arr[()] if arr.ndim == 0 else arr
+
+
+def send(obj, dest, tag=0, comm=comm, header=True):
+    """
+    Send obj to rank dest, arrays as a raw buffer.
+
+    parameters
+    obj: array, number or any picklable object
+    dest (int): receiving rank
+    tag (int): message tag
+    comm (MPI.Comm): communicator
+    header (bool): send the shape and dtype first, False when the receiver
+        passes its own buffer to recv
+    """
+    if not header:
+        comm.Send(_as_buffer(obj), dest=dest, tag=tag)
+    elif is_buffer(obj):
+        arr = _as_buffer(obj)
+        comm.send(("array", arr.shape, arr.dtype.str), dest=dest, tag=tag)
+        comm.Send(arr, dest=dest, tag=tag)
+    else:
+        comm.send(("object", obj), dest=dest, tag=tag)
+
+
+def recv(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, comm=comm, out=None):
+    """
+    Receive what send sent.
+
+    parameters
+    source (int): sending rank
+    tag (int): message tag
+    comm (MPI.Comm): communicator
+    out (np.array): buffer to receive into, for a send with header=False
+
+    returns
+    obj: the received array, number or object
+    """
+    if out is not None:
+        comm.Recv(out, source=source, tag=tag)
+        return out
+    status = MPI.Status()
+    kind, *meta = comm.recv(source=source, tag=tag, status=status)
+    if kind == "object":
+        return meta[0]
+    arr = np.empty(meta[0], dtype=meta[1])
+    comm.Recv(arr, source=status.Get_source(), tag=status.Get_tag())
+    return _unwrap(arr)
+
+
+def isend(buf, dest, tag=0, comm=comm):
+    """Non-blocking buffer send, buf must not change until it completes."""
+    return comm.Isend(_as_buffer(buf), dest=dest, tag=tag)
+
+
+def irecv(buf, source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, comm=comm):
+    """Non-blocking receive into the preallocated array buf."""
+    return comm.Irecv(buf, source=source, tag=tag)
+
+
+def bcast(value, root=0, comm=comm, header=True):
+    """
+    Broadcast value from root.
+
+    parameters
+    value: data on root; with header=False an array of the broadcast
+        shape and dtype on every rank, which is filled in place
+    root (int): broadcasting rank
+    comm (MPI.Comm): communicator
+    header (bool): broadcast the shape and dtype first
+
+    returns
+    value: the broadcast data on every rank
+    """
+    if not header:
+        comm.Bcast(value, root=root)
+        return value
+    meta = None
+    if comm.Get_rank() == root:
+        if is_buffer(value):
+            value = _as_buffer(value)
+            meta = ("array", value.shape, value.dtype.str)
+        else:
+            meta = ("object", value)
+    kind, *meta = comm.bcast(meta, root=root)
+    if kind == "object":
+        return meta[0]
+    if comm.Get_rank() != root:
+        value = np.empty(meta[0], dtype=meta[1])
+    comm.Bcast(value, root=root)
+    return _unwrap(value)
+
+
+def reduce(value, op=MPI.SUM, root=0, comm=comm):
+    """
+    Combine value from every rank with op onto root.
+
+    returns
+    result: the reduction on root, None on the other ranks
+    """
+    if not is_buffer(value):
+        return comm.reduce(value, op=op, root=root)
+    value = _as_buffer(value)
+    result = np.empty_like(value)
+    comm.Reduce(value, result, op=op, root=root)
+    return _unwrap(result) if comm.Get_rank() == root else None
+
+
+def allreduce(value, op=MPI.SUM, comm=comm):
+    """Combine value from every rank with op, the result on every rank."""
+    if not is_buffer(value):
+        return comm.allreduce(value, op=op)
+    value = _as_buffer(value)
+    result = np.empty_like(value)
+    comm.Allreduce(value, result, op=op)
+    return _unwrap(result)
+
+
+def ring_pipeline(block, func, comm=comm):
+    """
+    Pass every rank's block once around the ring, rank r sending to r + 1.
+    func(block, owner) is called on each block in turn, starting with the
+    rank's own, while the next block is already being received into a
+    second buffer, so computation overlaps communication. func must not
+    modify the block it is given. Blocks must have the same shape and
+    dtype on every rank.
+
+    returns
+    results (list): func results in the order the blocks were visited
+    """
+    rank, size = comm.Get_rank(), comm.Get_size()
+    right, left = (rank + 1) % size, (rank - 1) % size
+    current = _as_buffer(block)
+    spare = np.empty_like(current)
+    results = []
+    for step in range(size):
+        requests = []
+        if step < size - 1:
+            requests = [irecv(spare, source=left, tag=step, comm=comm),
+                        isend(current, dest=right, tag=step, comm=comm)]
+        results.append(func(current, (rank - step) % size))
+        MPI.Request.Waitall(requests)
+        current, spare = spare, current
+    return results
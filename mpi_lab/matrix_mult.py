@@ -1,30 +1,145 @@
+import sys
+
 from mpi4py import MPI
 import numpy as np
 
+from communication import bcast
+
+"""
+Distributed matrix-vector and matrix-matrix products with a block row
+decomposition. Rank 0 holds A and x (or B). x is broadcast to every rank,
+each rank receives a contiguous block of rows of A with Scatterv and the
+row blocks of the product are collected on rank 0 with Gatherv, so N does
+not have to be a multiple of the number of ranks.
+
+The rows of every block are sent in chunks with non-blocking collectives:
+a rank multiplies one chunk while the next ones are still arriving, and
+the finished rows are already on their way back to rank 0 while it works
+on the rest. All requests are waited on before the product is returned.
+
+    mpiexec -n 4 python matrix_mult.py [N] [M]
+"""
+
 comm = MPI.COMM_WORLD
 rank = comm.Get_rank()
 size = comm.Get_size()
-N = comm.Get_size()
 
-A_matrix = None
-if rank == 0:
-    A_matrix = np.random.rand(N, N)
 
-A_array = np.empty(N, dtype='d')
-comm.Scatter(A_matrix, A_array, root=0)
+def block_partition(n, nparts):
+    """
+    Split n items into nparts contiguous blocks whose sizes differ by at
+    most one.
+
+    returns
+    counts (np.array): items in each block
+    displs (np.array): index of the first item of each block
+    """
+    counts = np.full(nparts, n // nparts, dtype=np.int64)
+    counts[:n % nparts] += 1
+    displs = np.zeros(nparts, dtype=np.int64)
+    np.cumsum(counts[:-1], out=displs[1:])
+    return counts, displs
+
+
+def chunk_layout(n, nparts, nchunks):
+    """
+    Rows of every block of a block row partition split into nchunks.
+
+    returns
+    rows (np.array): (nchunks, nparts) rows of chunk c in block p
+    first (np.array): (nchunks, nparts) global index of their first row
+    displs (np.array): index of the first row of each block
+    """
+    counts, displs = block_partition(n, nparts)
+    split = [block_partition(count, nchunks) for count in counts]
+    rows = np.array([c for c, _ in split]).T
+    first = np.array([d for _, d in split]).T + displs
+    return rows, first, displs
+
+
+def matmul(A, B, comm=comm, root=0, nchunks=4):
+    """
+    A @ B with the rows of A distributed over the ranks of comm.
+
+    parameters
+    A (np.array): (N, K) matrix on root, ignored on the other ranks
+    B (np.array): (K,) vector or (K, M) matrix on root, ignored elsewhere
+    comm (MPI.Comm): communicator to distribute over
+    root (int): rank holding A and B and receiving the product
+    nchunks (int): pieces each rank's block of rows is sent in
+
+    returns
+    y (np.array): (N,) or (N, M) product on root, None on the other ranks
+    """
+    rank = comm.Get_rank()
+    if rank == root:
+        A = np.ascontiguousarray(A, dtype='d')
+        B = np.ascontiguousarray(B, dtype='d')
+        shape = A.shape + B.shape[1:]
+    else:
+        shape = None
+    N, K, *M = bcast(shape, root=root, comm=comm)
+    ncols = M[0] if M else 1
+
+    if rank != root:
+        B = np.empty([K] + M, dtype='d')
+    requests = [comm.Ibcast(B, root=root)]
+
+    rows, first, displs = chunk_layout(N, comm.Get_size(), nchunks)
+    local_A = np.empty((rows[:, rank].sum(), K), dtype='d')
+    local_y = np.empty([len(local_A)] + M, dtype='d')
+    y = np.empty([N] + M, dtype='d') if rank == root else None
+
+    # every chunk of A is in flight before any computation starts
+    scatters = []
+    for c in range(nchunks):
+        lo = first[c, rank] - displs[rank]
+        send = None
+        if rank == root:
+            send = [A, (rows[c] * K).tolist(), (first[c] * K).tolist(),
+                    MPI.DOUBLE]
+        scatters.append(comm.Iscatterv(send, local_A[lo:lo + rows[c, rank]],
+                                       root=root))
+
+    requests[0].Wait()
+    for c in range(nchunks):
+        lo = first[c, rank] - displs[rank]
+        hi = lo + rows[c, rank]
+        scatters[c].Wait()
+        np.dot(local_A[lo:hi], B, out=local_y[lo:hi])
+        recv = None
+        if rank == root:
+            recv = [y, (rows[c] * ncols).tolist(),
+                    (first[c] * ncols).tolist(), MPI.DOUBLE]
+        requests.append(comm.Igatherv(local_y[lo:hi], recv, root=root))
+    MPI.Request.Waitall(requests)
+    return y
+
+
+def matvec(A, x, comm=comm, root=0, nchunks=4):
+    """A @ x for a (N, K) matrix A and (K,) vector x, see matmul."""
+    return matmul(A, x, comm, root, nchunks)
 
-x = None
-if rank == 0:
-    x = np.random.rand(N)
-x_array = comm.bcast(x, root=0)
 
-y = np.dot(A_array, x_array)
-comm.Barrier()
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    M = int(sys.argv[2]) if len(sys.argv) > 2 else 100
 
-y_array= None
-if rank == 0:
-    y_array = np.empty(N, dtype='d')
+    A_matrix = x = B = None
+    if rank == 0:
+        rng = np.random.default_rng(0)
+        A_matrix = rng.random((N, N))
+        x = rng.random(N)
+        B = rng.random((N, M))
 
-comm.Igather(y, y_array, root=0)
-if rank == 0:
-    print(str(A_matrix) + "*" + str(x_array.reshape(-1, 1)) + " = " + str(y_array.reshape(-1, 1)))
\ No newline at end of file
+    for name, func, other in [("matvec", matvec, x), ("matmul", matmul, B)]:
+        comm.Barrier()
+        start = MPI.Wtime()
+        y = func(A_matrix, other)
+        elapsed = MPI.Wtime() - start
+        if rank == 0:
+            check = np.dot(A_matrix, other)
+            error = np.abs(y - check).max()
+            print(f"{name} N={N} ranks={size}: {elapsed:.4f}s, "
+                  f"max |y - np.dot| = {error:.2e}")
+            assert np.allclose(y, check)
@@ -1,25 +1,28 @@
 from mpi4py import MPI
 import numpy as np
 
+from communication import recv, send
+
 comm = MPI.COMM_WORLD
 rank = comm.Get_rank()
+size = comm.Get_size()
+
+# message[0] is the random number, rank r fills in the running product
+# message[r] = r * message[r - 1].
+# Every rank knows the message shape, so it travels as a raw buffer.
+message = np.zeros(size, dtype=np.int64)
 
 if rank == 0:
-    num = str(np.random.randint(1, 10))
-    message = {"text": ["hello world!", num]}
-    comm.send(message, dest=1)
+    message[0] = np.random.randint(1, 10)
+    send(message, dest=1, header=False)
+
+elif rank == size - 1:
+    recv(source=rank-1, out=message)
+    message[rank] = rank * message[rank - 1]
+    print("hello world! " + " ".join(str(n) for n in message) +
+          " goodbye world!")
 
-elif rank == comm.Get_size() - 1:
-    message = comm.recv(source=rank-1)
-    num = int(message["text"][rank])
-    message["text"].extend([str(rank * num), "goodbye world!"])
-    mess = ""
-    for s in message["text"]:
-        mess += s + " "
-    print(mess)
-    
 else:
-    message = comm.recv(source=rank-1)
-    num = int(message["text"][rank])
-    message["text"].extend([str(rank * num)])
-    comm.send(message, dest=rank+1)
+    recv(source=rank-1, out=message)
+    message[rank] = rank * message[rank - 1]
+    send(message, dest=rank+1, header=False)
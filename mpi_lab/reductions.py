@@ -0,0 +1,156 @@
+import sys
+
+from mpi4py import MPI
+import numpy as np
+
+from communication import allreduce, bcast, reduce
+from matrix_mult import block_partition
+
+"""
+Distributed reductions over a 1-D array held on one rank. scatter splits
+the array into blocks whose sizes differ by at most one with Scatterv, so
+no element is dropped when N is not a multiple of the number of ranks.
+Each rank reduces its block with NumPy and the partial results are
+combined with the buffer based Reduce (result on root) or Allreduce
+(root=None, result on every rank) of communication.py.
+
+    mpiexec -n 4 python reductions.py [N ...]
+"""
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+size = comm.Get_size()
+
+
+def scatter(data, comm=comm, root=0):
+    """
+    Block of a 1-D array on root for every rank of comm.
+
+    parameters
+    data (np.array): array to distribute on root, ignored on other ranks
+    comm (MPI.Comm): communicator to distribute over
+    root (int): rank holding data
+
+    returns
+    local (np.array): this rank's contiguous block of data
+    """
+    if comm.Get_rank() == root:
+        data = np.ascontiguousarray(data).ravel()
+        meta = (data.size, data.dtype.str)
+    else:
+        meta = None
+    n, dtype = bcast(meta, root=root, comm=comm)
+    counts, displs = block_partition(n, comm.Get_size())
+    local = np.empty(counts[comm.Get_rank()], dtype=dtype)
+    send = None
+    if comm.Get_rank() == root:
+        send = [data, (counts.tolist(), displs.tolist())]
+    comm.Scatterv(send, local, root=root)
+    return local
+
+
+def _reduce(partial, op, comm, root):
+    """Combine partial results on root, or on every rank if root is None."""
+    if root is None:
+        return allreduce(partial, op=op, comm=comm)
+    return reduce(partial, op=op, root=root, comm=comm)
+
+
+def _lowest(dtype):
+    """Smallest value of dtype, the identity of max for empty blocks."""
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return -np.inf
+    return np.iinfo(dtype).min
+
+
+def dist_sum(local, comm=comm, root=0):
+    """Sum of all blocks, on root or on every rank if root is None."""
+    return _reduce(np.sum(local), MPI.SUM, comm, root)
+
+
+def dist_max(local, comm=comm, root=0):
+    """Maximum of all blocks, on root or on every rank if root is None."""
+    partial = np.max(local, initial=_lowest(local.dtype))
+    return _reduce(partial, MPI.MAX, comm, root)
+
+
+def dist_mean(local, comm=comm, root=0):
+    """Mean of all blocks, sum and count are reduced in one message."""
+    partial = np.array([np.sum(local, dtype='d'), local.size], dtype='d')
+    total = _reduce(partial, MPI.SUM, comm, root)
+    return None if total is None else total[0] / total[1]
+
+
+def dist_histogram(local, bins=10, range=None, comm=comm, root=0):
+    """
+    Histogram of all blocks with common bin edges.
+
+    parameters
+    local (np.array): this rank's block
+    bins (int or np.array): number of bins or bin edges, as np.histogram
+    range (tuple): (min, max) of the bins, the global extent of the data
+        if not given
+    comm (MPI.Comm): communicator the blocks are distributed over
+    root (int): rank receiving the counts, every rank if None
+
+    returns
+    counts (np.array): counts per bin on root, None on other ranks
+    edges (np.array): bin edges
+    """
+    if range is None and np.ndim(bins) == 0:
+        extent = np.array([-np.min(local, initial=np.inf),
+                           np.max(local, initial=-np.inf)], dtype='d')
+        extent = allreduce(extent, op=MPI.MAX, comm=comm)
+        range = (-extent[0], extent[1])
+    counts, edges = np.histogram(local, bins=bins, range=range)
+    return _reduce(counts.astype(np.int64), MPI.SUM, comm, root), edges
+
+
+REDUCTIONS = {
+    "sum": dist_sum,
+    "max": dist_max,
+    "mean": dist_mean,
+    "histogram": dist_histogram,
+}
+
+CHECKS = {
+    "sum": np.sum,
+    "max": np.max,
+    "mean": np.mean,
+    "histogram": lambda data: np.histogram(data)[0],
+}
+
+
+def time_reductions(N, repeat=5):
+    """
+    Best of repeat wall times for scattering N doubles and for each
+    reduction of the scattered blocks, checked against NumPy on rank 0.
+    """
+    data = np.random.default_rng(0).random(N) if rank == 0 else None
+    times = {}
+    for _ in range(repeat):
+        comm.Barrier()
+        start = MPI.Wtime()
+        local = scatter(data)
+        times["scatter"] = min(times.get("scatter", np.inf),
+                               MPI.Wtime() - start)
+        for name, func in REDUCTIONS.items():
+            comm.Barrier()
+            start = MPI.Wtime()
+            result = func(local)
+            times[name] = min(times.get(name, np.inf), MPI.Wtime() - start)
+            if rank == 0:
+                if name == "histogram":
+                    result = result[0]
+                assert np.allclose(result, CHECKS[name](data)), name
+    return times
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10, 1000, 10001, 10**6 + 1]
+    for N in sizes:
+        times = time_reductions(N)
+        if rank == 0:
+            print(f"ranks={size} N={N} " + " ".join(
+                f"{name}={t:.3e}" for name, t in times.items()))